@@ -0,0 +1,92 @@
+"""
+Scaling benchmark for the frame graph, run outside of Krita.
+
+Generates synthetic projects with dense alias fan-out and reports how long it takes to parse the layer names, build
+the index, and query every frame's destinations.
+
+    python benchmarks/benchmark_frame_graph.py
+    python benchmarks/benchmark_frame_graph.py --sizes 1000 5000 --fan-out 32 --repeat 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Callable, List, Tuple
+
+# The plugin package imports Krita when it's imported, so load the Krita-independent module directly.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "choose_your_own_animation"))
+from frame_graph import FrameGraph, parse_layer_name  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+
+def generate_layer_names(layer_count: int, fan_out: int, destinations_per_frame: int, seed: int) -> List[str]:
+    """
+    Layer names where every frame belongs to a group alias shared by `fan_out` frames, and lists a few group aliases
+    as destinations. Each destination alias therefore resolves to `fan_out` frames.
+    """
+    rng = random.Random(seed)
+    group_count = max(1, layer_count // fan_out)
+    layer_names = []
+    for i in range(layer_count):
+        destinations = " ".join(f"G{rng.randrange(group_count)}" for _ in range(destinations_per_frame))
+        layer_names.append(f"Frame_{i:06d} (G{i % group_count} S{i}) [Synthetic frame {i}] - {destinations}")
+    return layer_names
+
+
+def best_time(repeat: int, function: Callable[[], object]) -> Tuple[float, object]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def build_from_parsed(parsed_layers) -> FrameGraph:
+    graph = FrameGraph()
+    for layer_name, parsed, handle in parsed_layers:
+        graph.add_parsed_layer(layer_name, parsed, handle)
+    graph.resolve()
+    return graph
+
+
+def query_all(graph: FrameGraph) -> int:
+    edge_count = 0
+    for frame_id in graph.frame_ids():
+        edge_count += len(graph.destination_ids(frame_id))
+    return edge_count
+
+
+def run(sizes: List[int], fan_out: int, destinations_per_frame: int, repeat: int, seed: int) -> None:
+    print(f"fan-out {fan_out}, {destinations_per_frame} destination alias(es) per frame, best of {repeat}")
+    print(f"{'layers':>9} {'edges':>11} {'parse ms':>10} {'index ms':>10} {'query ms':>10} {'us/layer':>9}")
+    for size in sizes:
+        layer_names = generate_layer_names(size, fan_out, destinations_per_frame, seed)
+
+        parse_seconds, parsed = best_time(repeat, lambda: [parse_layer_name(name) for name in layer_names])
+        parsed_layers = [(name, result, index) for index, (name, result) in enumerate(zip(layer_names, parsed))]
+        index_seconds, graph = best_time(repeat, lambda: build_from_parsed(parsed_layers))
+        query_seconds, edge_count = best_time(repeat, lambda: query_all(graph))
+
+        per_layer_us = (parse_seconds + index_seconds) / size * 1e6
+        print(f"{size:>9} {edge_count:>11} {parse_seconds * 1e3:>10.1f} {index_seconds * 1e3:>10.1f} "
+              f"{query_seconds * 1e3:>10.1f} {per_layer_us:>9.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="layer counts to generate")
+    parser.add_argument("--fan-out", type=int, default=16, help="frames sharing each group alias")
+    parser.add_argument("--destinations", type=int, default=3, help="destination aliases listed per frame")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.fan_out, args.destinations, args.repeat, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+End-to-end performance run of the docker against the in-memory Krita stand-in in fake_krita.py.
+
+Generates a project of N frames, initializes it, performs M appends, and reloads it. Reports wall time along with the
+Krita API calls made and their simulated cost, so growth in the append and regenerate paths shows up as numbers.
+
+    python benchmarks/benchmark_headless.py
+    python benchmarks/benchmark_headless.py --frames 2000 --appends 500 --duration 2
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import List
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIRECTORY)
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIRECTORY))
+
+import fake_krita  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+fake_krita.install()
+from choose_your_own_animation.choose_your_own_animation import ChooseYourOwnAnimation  # noqa: E402
+
+
+def create_project(directory: str, frame_count: int, destinations_per_frame: int, seed: int) -> fake_krita.Document:
+    rng = random.Random(seed)
+    document = fake_krita.Document(os.path.join(directory, "project.kra"))
+    root = document.rootNode()
+    root.addChildNode(document.createNode(ChooseYourOwnAnimation.BACKGROUND_LAYER_NAME, fake_krita.Node.PAINT_LAYER),
+                      None)
+    frames_group = document.createNode(ChooseYourOwnAnimation.FRAMES_ROOT_LAYER_NAME, fake_krita.Node.GROUP_LAYER)
+    root.addChildNode(frames_group, root.childNodes()[-1])
+
+    frames = []
+    for i in range(frame_count):
+        destinations = " ".join(f"F{rng.randrange(frame_count)}" for _ in range(destinations_per_frame))
+        frames.append(document.createNode(f"F{i} [Frame {i}] - F{(i + 1) % frame_count} {destinations}",
+                                          fake_krita.Node.PAINT_LAYER, seed=i))
+    frames_group.setChildNodes(frames)
+    return document
+
+
+def run_until_idle(application: QApplication, docker: ChooseYourOwnAnimation) -> None:
+    while docker.job_scheduler.is_running():
+        application.processEvents()
+
+
+def report_calls(title: str, seconds: float) -> None:
+    simulated_ms = sum(fake_krita.simulated_cost_ms.values())
+    call_count = sum(fake_krita.api_calls.values())
+    print(f"\n{title}: {seconds * 1e3:.1f} ms wall, {call_count} Krita API calls, "
+          f"{simulated_ms:.1f} ms simulated Krita time")
+    for call, count in fake_krita.api_calls.most_common(8):
+        print(f"  {call:<28} {count:>8} {fake_krita.simulated_cost_ms[call]:>10.1f} ms")
+
+
+def mean_ms(values: List[float]) -> float:
+    return sum(values) / len(values) * 1e3 if values else 0.0
+
+
+def run(frame_count: int, append_count: int, duration: int, seed: int) -> None:
+    application = QApplication.instance() or QApplication([])
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        document = create_project(directory, frame_count, 3, seed)
+        fake_krita.Krita.instance().setActiveDocument(document)
+        docker = ChooseYourOwnAnimation()
+        print(f"{frame_count} frames, {append_count} appends of {duration} frame(s) each")
+
+        fake_krita.reset_counters()
+        start = time.perf_counter()
+        docker.reload_from_file()
+        run_until_idle(application, docker)
+        report_calls("Initialize", time.perf_counter() - start)
+
+        fake_krita.reset_counters()
+        append_seconds = []
+        frame_name = docker.frame_graph.frame_names()[0]
+        for _ in range(append_count):
+            start = time.perf_counter()
+            docker._append_animation_frames(frame_name, duration)
+            append_seconds.append(time.perf_counter() - start)
+            frame_name = rng.choice(docker.frame_graph.destination_names(frame_name))
+        report_calls("Appends", sum(append_seconds))
+        window = max(1, min(20, append_count // 4))
+        print(f"  first {window} appends: {mean_ms(append_seconds[:window]):.2f} ms each, "
+              f"last {window}: {mean_ms(append_seconds[-window:]):.2f} ms each")
+
+        fake_krita.reset_counters()
+        start = time.perf_counter()
+        docker.reload_from_file()
+        run_until_idle(application, docker)
+        report_calls("Reload", time.perf_counter() - start)
+
+        print("\nProfile:")
+        print(docker.profiler.format_summary())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=500, help="frames in the generated project")
+    parser.add_argument("--appends", type=int, default=200, help="appends to perform after initializing")
+    parser.add_argument("--duration", type=int, default=2, help="timeline frames added per append")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.frames, args.appends, args.duration, args.seed)
+
+
+if __name__ == "__main__":
+    main()
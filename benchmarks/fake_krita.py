@@ -0,0 +1,294 @@
+"""
+An in-memory stand-in for the part of Krita's `krita` module that the plugin uses.
+
+It keeps a real node tree, writes real PNG files on `save()`, and counts every API call along with a simulated cost,
+so the plugin's reload and append paths can be run and measured without Krita. Install it before importing the
+plugin with `install()`. PyQt5 is still needed, since the plugin's docker is a real Qt widget.
+"""
+import sys
+from collections import Counter
+from typing import Dict, List, Optional
+
+from PyQt5.QtCore import QByteArray, QRect, QUuid
+from PyQt5.QtGui import QColor, QImage
+from PyQt5.QtWidgets import QDockWidget
+
+# Rough milliseconds that Krita spends on each call, so runs can report where a real Krita would spend its time.
+# Cloning is charged per node in the cloned subtree.
+SIMULATED_COST_MS: Dict[str, float] = {
+    "Node.clone": 0.3,
+    "Node.addChildNode": 0.05,
+    "Node.setChildNodes": 0.05,
+    "Node.remove": 0.05,
+    "Node.save": 8.0,
+    "Node.thumbnail": 1.5,
+    "Node.pixelData": 0.5,
+    "Document.createFileLayer": 3.0,
+    "Document.createCloneLayer": 0.1,
+    "Document.createGroupLayer": 0.1,
+    "Document.nodeByName": 0.01,
+}
+
+api_calls: Counter = Counter()
+simulated_cost_ms: Counter = Counter()
+
+
+def _record(call: str, units: int = 1) -> None:
+    api_calls[call] += 1
+    simulated_cost_ms[call] += SIMULATED_COST_MS.get(call, 0.0) * units
+
+
+def reset_counters() -> None:
+    api_calls.clear()
+    simulated_cost_ms.clear()
+
+
+def install() -> None:
+    sys.modules["krita"] = sys.modules[__name__]
+
+
+class InfoObject:
+    def __init__(self):
+        self.properties = {}
+
+    def setProperty(self, key, value) -> None:
+        self.properties[key] = value
+
+
+class Node:
+    PAINT_LAYER = "paintlayer"
+    GROUP_LAYER = "grouplayer"
+    FILE_LAYER = "filelayer"
+    CLONE_LAYER = "clonelayer"
+
+    def __init__(self, document: "Document", name: str, node_type: str, seed: int = 0,
+                 file_path: str = "", source: Optional["Node"] = None):
+        self._document = document
+        self._name = name
+        self._type = node_type
+        self._seed = seed
+        self._file_path = file_path
+        self._source = source
+        self._children: List[Node] = []
+        self._parent: Optional[Node] = None
+        self._visible = True
+        self._collapsed = False
+        self._pinned = False
+        self._uuid = QUuid.createUuid()
+
+    def name(self) -> str:
+        return self._name
+
+    def setName(self, name: str) -> None:
+        self._name = name
+
+    def type(self) -> str:
+        return self._type
+
+    def uniqueId(self) -> QUuid:
+        return self._uuid
+
+    def visible(self) -> bool:
+        return self._visible
+
+    def setVisible(self, visible: bool) -> None:
+        self._visible = visible
+
+    def setCollapsed(self, collapsed: bool) -> None:
+        self._collapsed = collapsed
+
+    def setPinnedToTimeline(self, pinned: bool) -> None:
+        self._pinned = pinned
+
+    def parentNode(self) -> Optional["Node"]:
+        return self._parent
+
+    def childNodes(self) -> List["Node"]:
+        _record("Node.childNodes")
+        return list(self._children)
+
+    def addChildNode(self, child: "Node", above: Optional["Node"]) -> bool:
+        _record("Node.addChildNode")
+        if child._parent:
+            child._parent._children.remove(child)
+        index = self._children.index(above) + 1 if above in self._children else 0
+        self._children.insert(index, child)
+        child._parent = self
+        return True
+
+    def setChildNodes(self, children: List["Node"]) -> None:
+        _record("Node.setChildNodes")
+        for child in self._children:
+            child._parent = None
+        self._children = []
+        for child in children:
+            if child._parent:
+                child._parent._children.remove(child)
+            child._parent = self
+            self._children.append(child)
+
+    def remove(self) -> bool:
+        _record("Node.remove")
+        if not self._parent:
+            return False
+        self._parent._children.remove(self)
+        self._parent = None
+        return True
+
+    def clone(self) -> "Node":
+        copy = self._copy()
+        _record("Node.clone", units=copy._count_nodes())
+        return copy
+
+    def _copy(self) -> "Node":
+        copy = Node(self._document, self._name, self._type, self._seed, self._file_path, self._source)
+        copy._visible = self._visible
+        copy._collapsed = self._collapsed
+        for child in self._children:
+            child_copy = child._copy()
+            child_copy._parent = copy
+            copy._children.append(child_copy)
+        return copy
+
+    def _count_nodes(self) -> int:
+        return 1 + sum(child._count_nodes() for child in self._children)
+
+    def bounds(self) -> QRect:
+        return QRect(0, 0, self._document.width(), self._document.height())
+
+    def pixelData(self, x: int, y: int, w: int, h: int) -> QByteArray:
+        _record("Node.pixelData")
+        return QByteArray(self._seed.to_bytes(8, "little") * (w * h // 2))
+
+    def _image(self, width: int, height: int) -> QImage:
+        image = QImage(width, height, QImage.Format_ARGB32)
+        image.fill(QColor.fromHsv(self._seed * 37 % 360, 160, 220))
+        return image
+
+    def thumbnail(self, w: int, h: int) -> QImage:
+        _record("Node.thumbnail")
+        return self._image(w, h)
+
+    def save(self, filename: str, xRes: float, yRes: float, exportConfiguration: InfoObject, exportRect=None) -> bool:
+        _record("Node.save")
+        # Qt's PNG writer takes a quality, where 0 is the most compression.
+        quality = 100 - 10 * exportConfiguration.properties.get("compression", 9)
+        return self._image(self._document.width(), self._document.height()).save(filename, "PNG", quality)
+
+
+class Document:
+    def __init__(self, file_name: str, width: int = 64, height: int = 64, frames_per_second: int = 24):
+        self._file_name = file_name
+        self._width = width
+        self._height = height
+        self._frames_per_second = frames_per_second
+        self._full_clip_range = (0, 0)
+        self._root = Node(self, "root", Node.GROUP_LAYER)
+        self._active_node: Optional[Node] = None
+
+    def fileName(self) -> str:
+        return self._file_name
+
+    def width(self) -> int:
+        return self._width
+
+    def height(self) -> int:
+        return self._height
+
+    def resolution(self) -> int:
+        return 72
+
+    def framesPerSecond(self) -> int:
+        return self._frames_per_second
+
+    def setFramesPerSecond(self, frames_per_second: int) -> None:
+        self._frames_per_second = frames_per_second
+
+    def setFullClipRangeStartTime(self, start_time: int) -> None:
+        self._full_clip_range = (start_time, self._full_clip_range[1])
+
+    def setFullClipRangeEndTime(self, end_time: int) -> None:
+        self._full_clip_range = (self._full_clip_range[0], end_time)
+
+    def rootNode(self) -> Node:
+        return self._root
+
+    def setActiveNode(self, node: Node) -> None:
+        self._active_node = node
+
+    def nodeByName(self, name: str) -> Optional[Node]:
+        _record("Document.nodeByName")
+        stack = list(reversed(self._root._children))
+        while stack:
+            node = stack.pop()
+            if node._name == name:
+                return node
+            stack.extend(reversed(node._children))
+        return None
+
+    def createNode(self, name: str, node_type: str, seed: int = 0) -> Node:
+        return Node(self, name, node_type, seed)
+
+    def createGroupLayer(self, name: str) -> Node:
+        _record("Document.createGroupLayer")
+        return Node(self, name, Node.GROUP_LAYER)
+
+    def createFileLayer(self, name: str, fileName: str, scalingMethod: str) -> Node:
+        _record("Document.createFileLayer")
+        return Node(self, name, Node.FILE_LAYER, file_path=fileName)
+
+    def createCloneLayer(self, name: str, source: Node) -> Node:
+        _record("Document.createCloneLayer")
+        return Node(self, name, Node.CLONE_LAYER, source=source)
+
+
+class _Action:
+    def trigger(self) -> None:
+        pass
+
+
+class Krita:
+    _instance: Optional["Krita"] = None
+
+    def __init__(self):
+        self._active_document: Optional[Document] = None
+        self.dock_widget_factories = []
+        self.batchmode = False
+
+    @classmethod
+    def instance(cls) -> "Krita":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def activeDocument(self) -> Optional[Document]:
+        return self._active_document
+
+    def setActiveDocument(self, document: Optional[Document]) -> None:
+        self._active_document = document
+
+    def setBatchmode(self, value: bool) -> None:
+        self.batchmode = value
+
+    def action(self, name: str) -> _Action:
+        return _Action()
+
+    def addDockWidgetFactory(self, factory: "DockWidgetFactory") -> None:
+        self.dock_widget_factories.append(factory)
+
+
+class DockWidget(QDockWidget):
+    def canvasChanged(self, canvas) -> None:
+        pass
+
+
+class DockWidgetFactoryBase:
+    DockLeft = 1
+    DockRight = 2
+
+
+class DockWidgetFactory(DockWidgetFactoryBase):
+    def __init__(self, docker_id: str, dock_position: int, docker_class):
+        self.docker_id = docker_id
+        self.dock_position = dock_position
+        self.docker_class = docker_class
@@ -1,52 +1,114 @@
 import datetime
+import hashlib
 import json
 import os
-import re
-from collections import defaultdict
-from typing import List, Dict, Set, Tuple, Optional, Match
+import shutil
+import time
+from collections import Counter
+from typing import List, Dict, Optional, Set, Tuple, Iterator
 
-from PyQt5.QtCore import QSize, Qt
-from PyQt5.QtGui import QStandardItem, QStandardItemModel, QIcon, QPixmap
+from PyQt5.QtCore import QSize, Qt, QTimer
+from PyQt5.QtGui import QImage
 from PyQt5.QtWidgets import QHBoxLayout, QGridLayout, QVBoxLayout, QListView, QPushButton, QWidget, QSplitter, QSpinBox, \
-    QTextEdit, QLineEdit, QLabel, QSizePolicy
+    QPlainTextEdit, QLineEdit, QLabel, QSizePolicy, QProgressBar, QComboBox, QCheckBox, QListWidget
 from krita import Krita, Document, Node, InfoObject, DockWidget, DockWidgetFactory, DockWidgetFactoryBase
 
+from .document_state_cache import DocumentStateCache
+from .frame_graph import FrameGraph, parse_layer_name
+from .frame_list_model import FrameFilterProxyModel, FrameListModel
+from .frame_routes import FrameRoutes
+from .frame_search import FrameSearchIndex
+from .job_scheduler import JobProgress, JobScheduler
+from .log_buffer import LogBuffer, LogEntry
+from .preview_player import FrameImageCache, PreviewPlayer, PreviewView
+from .profiling import Profiler
+from .sequence_generator import SequenceGenerator
+from .thumbnail_cache import ThumbnailCache
+from .timeline import Timeline, TimelineEntry
+
 
 class ChooseYourOwnAnimation(DockWidget):
     WINDOW_TITLE = "Choose Your Own Animation"
 
     ANIMATION_ROOT_LAYER_NAME = "Animation"
     PERFORMANCE_ROOT_LAYER_NAME = "Animation_Performance"
+    SOURCES_ROOT_LAYER_NAME = "Animation_Sources"
+    # Layers are found by name, so a source layer must never share a name with one of the layers above.
+    SOURCE_LAYER_NAME_PREFIX = "Source_"
     FRAMES_ROOT_LAYER_NAME = 'Frames'
     BACKGROUND_LAYER_NAME = 'Background'
-
-    INVALID_FILENAME_CHARACTERS = r'<>:"/\|?*'
-    INVALID_FILENAME_CHARACTERS_PATTERN = re.compile(f"[{re.escape(INVALID_FILENAME_CHARACTERS)}]")
-    COMMENT_PATTERN = re.compile(r"\[.*?]")
-    LAYER_NAME_PATTERN = re.compile(r"(?P<name>\S+)\s*(?:\((?P<aliases>[^()]+)\))? - (?P<destinations>.+)")
+    ANIMATION_CHUNK_LAYER_NAME_PREFIX = "Chunk_"
+    ANIMATION_CHUNK_FRAME_COUNT = 100
+    # Frame layer names are padded to this many digits, so they all have the same width up to 999,999 frames without
+    # renaming existing layers as the animation grows. Longer animations get wider names from there on.
+    ANIMATION_FRAME_LAYER_NAME_DIGITS = 6
+    GROUP_LAYER_TYPE = "grouplayer"
 
     NODE_DATA = Qt.UserRole + 1
 
     KEY_FRAMES_DIRECTORY = "frames_directory"
     KEY_FRAMES_PER_SECOND = "frames_per_second"
     KEY_FRAMES_LIST = "frames"
+    KEY_JOURNAL_SEQUENCE = "journal_sequence"
+    KEY_FRAME_EXPORT_PROFILE = "frame_export_profile"
+
+    KEY_JOURNAL_RECORD_SEQUENCE = "seq"
+    KEY_JOURNAL_RECORD_OPERATION = "op"
+    KEY_JOURNAL_RECORD_INDEX = "index"
+    JOURNAL_OPERATION_APPEND = "append"
+    JOURNAL_OPERATION_INSERT = "insert"
+    JOURNAL_OPERATION_DELETE = "delete"
+    JOURNAL_OPERATION_RETIME = "retime"
 
     KEY_FRAMES_LIST_FRAME_KEY = "frame_name"
     KEY_FRAMES_LIST_FRAME_DURATION = "duration"
 
     DESCRIPTOR_FILE_SUFFIX = "_cyoa_descriptor.json"
+    DESCRIPTOR_JOURNAL_FILE_SUFFIX = "_cyoa_descriptor.journal"
+    DESCRIPTOR_JOURNAL_COMPACTION_THRESHOLD = 256
     DESCRIPTOR_FRAMES_DIRECTORY = "cyoa_frames"
+    THUMBNAILS_DIRECTORY = "cyoa_thumbnails"
     FRAME_FULL_NAME_FILENAME = "frame_full_names.json"
+    # Every project keeps its own manifest in the frames directory, since the directory can be shared.
+    EXPORT_MANIFEST_FILE_SUFFIX = "_export_manifest.json"
+    KEY_EXPORT_MANIFEST_PROFILE = "profile"
+    KEY_EXPORT_MANIFEST_FRAMES = "frames"
+    PROFILE_FILE_SUFFIX = "_cyoa_profile.json"
+    PROFILE_TRACE_FILE_SUFFIX = "_cyoa_trace.json"
 
     SCALING_METHOD_NONE = "None"
+    THUMBNAIL_SIZE = 128
+    FRAME_LAYER_CHECK_INTERVAL_MS = 2000
+    EXPORT_MANIFEST_SAVE_INTERVAL = 50
+    # PNG compression level of each frame export profile. Lower levels encode faster and write bigger files.
+    FRAME_EXPORT_PROFILES = {"fast": 1, "balanced": 6, "archival": 9}
+    DEFAULT_FRAME_EXPORT_PROFILE = "balanced"
+    GENERATED_LENGTH_MAXIMUM = 1000000
+    PREVIEW_ENDING_SECONDS = 3
+    # Rough memory held per indexed frame and per timeline entry, for keeping cached documents within budget.
+    DOCUMENT_STATE_MEMORY_BUDGET_BYTES = 256 * 1024 * 1024
+    ESTIMATED_FRAME_BYTES = 2048
+    ESTIMATED_TIMELINE_ENTRY_BYTES = 200
+
+    # What the docker knows about the active document, swapped out when another document becomes active.
+    DOCUMENT_STATE_ATTRIBUTES = ("frame_graph", "frame_routes", "frame_search_index", "frame_layer_signature",
+                                 "layer_id_to_frame_name", "frame_name_to_fingerprint", "frame_name_to_source_layer",
+                                 "thumbnail_cache", "timeline", "descriptor_journal_sequence",
+                                 "descriptor_journal_length", "descriptor_signature", "frame_export_profile",
+                                 "pending_entries", "frames_model")
+    KEY_DOCUMENT_STATE_CURRENT_FRAME_NAME = "current_frame_name"
+
+    PHASE_EXPORTING = "Exporting frames"
+    PHASE_GENERATING = "Generating animation"
 
     def __init__(self):
         super().__init__()
-        self.full_log = ""
-        self.frame_name_to_node: Dict[str, Node] = {}
-        self.frame_name_to_destination_nodes: Dict[str, List[Node]] = {}
-
-        self.descriptor_frames = []
+        self.log_buffer = LogBuffer()
+        self.profiler = Profiler()
+        # File name and root layer id of the document the state below belongs to.
+        self.document_key: Optional[Tuple[str, str]] = None
+        self.document_states = DocumentStateCache(self.DOCUMENT_STATE_MEMORY_BUDGET_BYTES)
+        self._reset_document_state()
 
         self.controls = []
 
@@ -95,9 +157,53 @@ class ChooseYourOwnAnimation(DockWidget):
         left_layout.addWidget(self.button_reload, 3, 2)
         self.controls.append(self.button_reload)
 
-        self.log_text_area = QTextEdit()
+        self.log_level_combo_box = QComboBox()
+        self.log_level_combo_box.addItems(LogBuffer.LEVELS)
+        self.log_level_combo_box.setCurrentText(self.log_buffer.minimum_level)
+        self.log_level_combo_box.currentTextChanged.connect(self.set_log_level)
+        left_layout.addWidget(self.log_level_combo_box, 4, 1)
+
+        self.button_flatten = QPushButton("Flatten for Conversion")
+        self.button_flatten.clicked.connect(self.flatten_animation_layer)
+        left_layout.addWidget(self.button_flatten, 4, 2)
+        self.controls.append(self.button_flatten)
+
+        self.button_profile_summary = QPushButton("Profile Summary")
+        self.button_profile_summary.clicked.connect(self.log_profile_summary)
+        left_layout.addWidget(self.button_profile_summary, 5, 1)
+
+        self.button_export_profile = QPushButton("Export Profile")
+        self.button_export_profile.clicked.connect(self.export_profile)
+        left_layout.addWidget(self.button_export_profile, 5, 2)
+
+        frame_export_profile_label = QLabel("Frame export:")
+        left_layout.addWidget(frame_export_profile_label, 6, 1)
+        self.frame_export_profile_combo_box = QComboBox()
+        self.frame_export_profile_combo_box.addItems(self.FRAME_EXPORT_PROFILES)
+        self.frame_export_profile_combo_box.setCurrentText(self.DEFAULT_FRAME_EXPORT_PROFILE)
+        self.frame_export_profile_combo_box.setToolTip("How hard to compress the exported frames. Changing it "
+                                                       "exports every frame again on the next reload.")
+        self.frame_export_profile_combo_box.currentTextChanged.connect(self.set_frame_export_profile)
+        left_layout.addWidget(self.frame_export_profile_combo_box, 6, 2)
+        self.controls.append(self.frame_export_profile_combo_box)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setTextVisible(True)
+        left_layout.addWidget(self.progress_bar, 7, 1)
+        self.button_cancel = QPushButton("Cancel")
+        self.button_cancel.setEnabled(False)
+        left_layout.addWidget(self.button_cancel, 7, 2)
+
+        # Appending one block at a time, with a bounded block count, keeps logging cheap no matter how much we log.
+        self.log_text_area = QPlainTextEdit()
         self.log_text_area.setReadOnly(True)
-        left_layout.addWidget(self.log_text_area, 4, 1, 1, 2)
+        self.log_text_area.setMaximumBlockCount(LogBuffer.MAX_ENTRIES)
+        left_layout.addWidget(self.log_text_area, 8, 1, 1, 2)
+
+        self.job_scheduler = JobScheduler(self)
+        self.job_scheduler.progress_changed.connect(self._show_job_progress)
+        self.job_scheduler.running_changed.connect(self.button_cancel.setEnabled)
+        self.button_cancel.clicked.connect(self.job_scheduler.cancel)
 
         # Right side
         future_frames_box = QWidget()
@@ -108,23 +214,268 @@ class ChooseYourOwnAnimation(DockWidget):
         future_frames_box.setLayout(right_layout)
         base_splitter.addWidget(future_frames_box)
 
+        queue_layout = QHBoxLayout()
+        right_layout.addLayout(queue_layout)
+        self.queue_mode_checkbox = QCheckBox("Queue picks")
+        self.queue_mode_checkbox.setToolTip("Collect picks here, then add them to the animation all at once.")
+        queue_layout.addWidget(self.queue_mode_checkbox)
+        self.controls.append(self.queue_mode_checkbox)
+
+        self.pending_list = QListWidget()
+        self.pending_list.setFlow(QListView.LeftToRight)
+        self.pending_list.setWrapping(False)
+        self.pending_list.setMaximumHeight(self.pending_list.fontMetrics().height() * 3)
+        queue_layout.addWidget(self.pending_list, 1)
+
+        self.button_commit_queue = QPushButton("Commit Queue")
+        self.button_commit_queue.clicked.connect(self.commit_pending_entries)
+        queue_layout.addWidget(self.button_commit_queue)
+        self.controls.append(self.button_commit_queue)
+
+        self.button_clear_queue = QPushButton("Clear Queue")
+        self.button_clear_queue.clicked.connect(self.clear_pending_entries)
+        queue_layout.addWidget(self.button_clear_queue)
+        self.controls.append(self.button_clear_queue)
+
+        route_layout = QHBoxLayout()
+        right_layout.addLayout(route_layout)
+        route_layout.addWidget(QLabel("Go to frame:"))
+        self.target_frame_name_widget = QLineEdit()
+        route_layout.addWidget(self.target_frame_name_widget, 1)
+        self.controls.append(self.target_frame_name_widget)
+
+        self.button_show_path = QPushButton("Show Path")
+        self.button_show_path.clicked.connect(self.show_path_to_target)
+        route_layout.addWidget(self.button_show_path)
+        self.controls.append(self.button_show_path)
+
+        self.button_append_path = QPushButton("Append Path")
+        self.button_append_path.clicked.connect(self.append_path_to_target)
+        route_layout.addWidget(self.button_append_path)
+        self.controls.append(self.button_append_path)
+
+        self.button_analyze_graph = QPushButton("Analyze Frames")
+        self.button_analyze_graph.clicked.connect(self.analyze_frame_graph)
+        route_layout.addWidget(self.button_analyze_graph)
+        self.controls.append(self.button_analyze_graph)
+
+        generate_layout = QHBoxLayout()
+        right_layout.addLayout(generate_layout)
+        generate_layout.addWidget(QLabel("Generate frames:"))
+        self.generated_length_spinner = QSpinBox()
+        self.generated_length_spinner.setRange(1, self.GENERATED_LENGTH_MAXIMUM)
+        self.generated_length_spinner.setValue(240)
+        generate_layout.addWidget(self.generated_length_spinner)
+        self.controls.append(self.generated_length_spinner)
+
+        generate_layout.addWidget(QLabel("Ending on:"))
+        self.generated_end_frame_name_widget = QLineEdit()
+        self.generated_end_frame_name_widget.setPlaceholderText("Any frame")
+        generate_layout.addWidget(self.generated_end_frame_name_widget, 1)
+        self.controls.append(self.generated_end_frame_name_widget)
+
+        self.generate_replace_checkbox = QCheckBox("Replace timeline")
+        self.generate_replace_checkbox.setToolTip("Start a new animation instead of continuing the current one.")
+        generate_layout.addWidget(self.generate_replace_checkbox)
+        self.controls.append(self.generate_replace_checkbox)
+
+        self.button_generate = QPushButton("Generate")
+        self.button_generate.clicked.connect(self.generate_sequence)
+        generate_layout.addWidget(self.button_generate)
+        self.controls.append(self.button_generate)
+
+        edit_layout = QHBoxLayout()
+        right_layout.addLayout(edit_layout)
+        edit_layout.addWidget(QLabel("Pick:"))
+        self.edit_pick_spinner = QSpinBox()
+        self.edit_pick_spinner.setRange(1, self.GENERATED_LENGTH_MAXIMUM)
+        self.edit_pick_spinner.setToolTip("Which pick of the animation to edit, counting from 1.")
+        edit_layout.addWidget(self.edit_pick_spinner)
+        self.controls.append(self.edit_pick_spinner)
+
+        self.edit_frame_name_widget = QLineEdit()
+        self.edit_frame_name_widget.setPlaceholderText("Frame to insert")
+        edit_layout.addWidget(self.edit_frame_name_widget, 1)
+        self.controls.append(self.edit_frame_name_widget)
+
+        self.button_insert_pick = QPushButton("Insert Before")
+        self.button_insert_pick.clicked.connect(self.insert_pick)
+        edit_layout.addWidget(self.button_insert_pick)
+        self.controls.append(self.button_insert_pick)
+
+        self.button_delete_pick = QPushButton("Delete")
+        self.button_delete_pick.clicked.connect(self.delete_pick)
+        edit_layout.addWidget(self.button_delete_pick)
+        self.controls.append(self.button_delete_pick)
+
+        self.button_retime_pick = QPushButton("Set Duration")
+        self.button_retime_pick.setToolTip('Show the pick for the number of frames in "Frames to add".')
+        self.button_retime_pick.clicked.connect(self.retime_pick)
+        edit_layout.addWidget(self.button_retime_pick)
+        self.controls.append(self.button_retime_pick)
+
+        self.button_undo_last_pick = QPushButton("Undo Last Pick")
+        self.button_undo_last_pick.clicked.connect(self.undo_last_pick)
+        edit_layout.addWidget(self.button_undo_last_pick)
+        self.controls.append(self.button_undo_last_pick)
+
+        self.frame_search_widget = QLineEdit()
+        self.frame_search_widget.setPlaceholderText("Search frames, aliases and comments")
+        self.frame_search_widget.setClearButtonEnabled(True)
+        self.frame_search_widget.textChanged.connect(self.filter_choices)
+        right_layout.addWidget(self.frame_search_widget)
+
         # We don't need any "live update". A refresh button will do just fine.
         self.future_frames_list = QListView()
         self.future_frames_list.setViewMode(QListView.ViewMode.IconMode)
         self.future_frames_list.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.future_frames_list.setIconSize(QSize(128, 128))
+        self.future_frames_list.setIconSize(QSize(self.THUMBNAIL_SIZE, self.THUMBNAIL_SIZE))
         self.future_frames_list.setResizeMode(QListView.Adjust)
+        # Uniform sizes and batched layout keep the view from asking every row for its icon just to lay them out.
+        self.future_frames_list.setUniformItemSizes(True)
+        self.future_frames_list.setLayoutMode(QListView.Batched)
         self.future_frames_list.doubleClicked.connect(self.choice_double_clicked)
         self.controls.append(self.future_frames_list)
 
-        self.frames_model = QStandardItemModel()
-        self.future_frames_list.setModel(self.frames_model)
-        right_layout.addWidget(self.future_frames_list)
+        self.frames_filter_model = FrameFilterProxyModel(self)
+        self.frames_filter_model.setSourceModel(self.frames_model)
+        self.future_frames_list.setModel(self.frames_filter_model)
+        right_layout.addWidget(self.future_frames_list, 3)
+        # Hovering a choice previews it after the animation.
+        self.future_frames_list.setMouseTracking(True)
+        self.future_frames_list.entered.connect(self.preview_hovered_choice)
+        self.future_frames_list.viewportEntered.connect(self.clear_preview_hovered_choice)
+        self.preview_hovered_entry: Optional[TimelineEntry] = None
+
+        # The preview only reads the exported frame files, so it never touches the document's layers.
+        self.preview_view = PreviewView()
+        right_layout.addWidget(self.preview_view, 2)
+        self.preview_image_cache = FrameImageCache(self.frame_name_to_filepath,
+                                                   lambda frame_name: self.frame_name_to_fingerprint.get(frame_name,
+                                                                                                         frame_name),
+                                                   parent=self)
+        self.preview_player = PreviewPlayer(self.preview_view, self.preview_image_cache, self)
+
+        preview_layout = QHBoxLayout()
+        right_layout.addLayout(preview_layout)
+        self.button_preview_play = QPushButton("Play")
+        self.button_preview_play.setToolTip("Play the animation, then the queued picks and the hovered frame.")
+        self.button_preview_play.clicked.connect(self.play_preview)
+        preview_layout.addWidget(self.button_preview_play)
+
+        self.button_preview_play_ending = QPushButton("Play Ending")
+        self.button_preview_play_ending.setToolTip(f"Play the last {self.PREVIEW_ENDING_SECONDS} seconds of the "
+                                                   f"animation, then the queued picks and the hovered frame.")
+        self.button_preview_play_ending.clicked.connect(self.play_preview_ending)
+        preview_layout.addWidget(self.button_preview_play_ending)
+
+        self.button_preview_stop = QPushButton("Stop")
+        self.button_preview_stop.clicked.connect(self.stop_preview)
+        preview_layout.addWidget(self.button_preview_stop)
+
+        self.preview_frame_name_label = QLabel()
+        self.preview_player.frame_changed.connect(self.preview_frame_name_label.setText)
+        preview_layout.addWidget(self.preview_frame_name_label, 1)
+
+        # Krita doesn't tell us when layers are renamed, so we look for changes while the docker is shown.
+        self.frame_layer_check_timer = QTimer(self)
+        self.frame_layer_check_timer.setInterval(self.FRAME_LAYER_CHECK_INTERVAL_MS)
+        self.frame_layer_check_timer.timeout.connect(self.update_frame_index_if_layers_changed)
+        self.visibilityChanged.connect(self._set_frame_layer_checks_enabled)
+
+    def _reset_document_state(self) -> None:
+        self.frame_graph = FrameGraph()
+        self.frame_routes = FrameRoutes(self.frame_graph)
+        self.frame_search_index = FrameSearchIndex()
+        # Layer id to layer name for every leaf in the "Frames" group, as of the last time the index was updated.
+        self.frame_layer_signature: Dict[str, str] = {}
+        self.layer_id_to_frame_name: Dict[str, str] = {}
+        self.frame_name_to_fingerprint: Dict[str, str] = {}
+        self.frame_name_to_source_layer: Dict[str, Node] = {}
+        self.thumbnail_cache: Optional[ThumbnailCache] = None
+
+        self.timeline = Timeline()
+        self.descriptor_journal_sequence = 0
+        self.descriptor_journal_length = 0
+        # When the descriptor was last read or written, to notice when it's changed by something else.
+        self.descriptor_signature: Optional[Tuple[int, int]] = None
+        # None until chosen or read from the descriptor.
+        self.frame_export_profile: Optional[str] = None
+        self.pending_entries: List[TimelineEntry] = []
+
+        self.frames_model = FrameListModel(self.NODE_DATA, self.THUMBNAIL_SIZE, self.get_frame_thumbnail)
+        self.frames_model.thumbnails_rendered.connect(self._log_thumbnail_cache_counts)
 
     # noinspection PyPep8Naming
     def canvasChanged(self, canvas):
-        # TODO this is not "document changed". Should refresh future_frames when document loads.
-        pass
+        # Krita calls this for every view change, but the state only needs swapping when the document changes.
+        active_document = self.get_active_document()
+        document_key = self.get_document_key(active_document) if active_document else None
+        if document_key != self.document_key:
+            if self.job_scheduler.is_running():
+                self.log_warning("The document changed while working on it. Cancelling.")
+                self.job_scheduler.cancel()
+            self._switch_document_state(document_key)
+        self.update_frame_index_if_layers_changed()
+
+    def _switch_document_state(self, document_key: Optional[Tuple[str, str]]) -> None:
+        """Put the current document's state in the cache, and bring back the new document's state if it's there."""
+        self.stop_preview()
+        if self.document_key is not None:
+            state = {name: getattr(self, name) for name in self.DOCUMENT_STATE_ATTRIBUTES}
+            state[self.KEY_DOCUMENT_STATE_CURRENT_FRAME_NAME] = self.current_frame_name_widget.text()
+            for evicted_key in self.document_states.put(self.document_key, state,
+                                                        self._estimate_document_state_bytes()):
+                self.log_info(f"Dropped the cached state of {evicted_key[0] or 'an unsaved document'} to save memory.")
+
+        state = self.document_states.take(document_key) if document_key else None
+        self.document_key = document_key
+        if state:
+            current_frame_name = state.pop(self.KEY_DOCUMENT_STATE_CURRENT_FRAME_NAME)
+            for name, value in state.items():
+                setattr(self, name, value)
+        else:
+            current_frame_name = ""
+            self._reset_document_state()
+
+        self.frames_filter_model.setSourceModel(self.frames_model)
+        self.filter_choices()
+        self._show_frame_export_profile()
+        self.current_frame_name_widget.setText(current_frame_name)
+        self.pending_list.clear()
+        self.pending_list.addItems(f"{entry.frame_name} \u00d7{entry.duration}" for entry in self.pending_entries)
+        if state:
+            self.log_info(f"Switched to {document_key[0] or 'an unsaved document'} using its cached state.")
+            self._reload_descriptor_if_changed()
+
+    def _estimate_document_state_bytes(self) -> int:
+        size_bytes = len(self.frame_graph) * self.ESTIMATED_FRAME_BYTES
+        size_bytes += len(self.timeline) * self.ESTIMATED_TIMELINE_ENTRY_BYTES
+        size_bytes += self.frames_model.memory_bytes()
+        if self.thumbnail_cache:
+            size_bytes += self.thumbnail_cache.memory_bytes()
+        return size_bytes
+
+    def _reload_descriptor_if_changed(self) -> None:
+        if self.descriptor_signature is None or self._get_descriptor_signature() == self.descriptor_signature:
+            return
+        self.log_warning("The descriptor changed while the document was in the background. Reading it again. "
+                         "Click \"Initialize / Reload\" to update the Animation layer to match.")
+        self._load_descriptor()
+
+    @classmethod
+    def get_document_key(cls, document: Document) -> Tuple[str, str]:
+        return document.fileName(), cls.get_node_id(document.rootNode())
+
+    def _set_frame_layer_checks_enabled(self, enabled: bool) -> None:
+        if enabled:
+            self.frame_layer_check_timer.start()
+        else:
+            self.frame_layer_check_timer.stop()
+            self.stop_preview()
+
+    def log_debug(self, text: str) -> None:
+        self._log("DEBUG", text)
 
     def log_info(self, text: str) -> None:
         self._log("INFO", text)
@@ -137,13 +488,34 @@ class ChooseYourOwnAnimation(DockWidget):
 
     def _log(self, prefix: str, text: str) -> None:
         time = datetime.datetime.now().strftime("%H:%M")
-        self.full_log += f"{time} {prefix} {text}\n"
-        self.log_text_area.setPlainText(self.full_log)
-        self.scroll_log_to_bottom()
+        entry = LogEntry(time, prefix, text)
+        if self.log_buffer.append(entry):
+            self.log_text_area.appendPlainText(entry.format())
+            self.scroll_log_to_bottom()
 
     def clear_log(self) -> None:
-        self.full_log = ""
-        self.log_text_area.setPlainText("")
+        self.log_buffer.clear()
+        self.log_text_area.clear()
+
+    def set_log_level(self, level: str) -> None:
+        self.log_buffer.minimum_level = level
+        self.log_text_area.setPlainText("\n".join(entry.format() for entry in self.log_buffer.shown_entries()))
+        self.scroll_log_to_bottom()
+
+    def log_profile_summary(self) -> None:
+        self.log_info("Profile summary:\n" + self.profiler.format_summary())
+
+    def export_profile(self) -> None:
+        if not self.get_active_document():
+            self.log_error("Make or open a document.")
+            return
+        profile_filepath = self._get_document_sidecar_filepath(self.PROFILE_FILE_SUFFIX)
+        with open(profile_filepath, 'w') as outfile:
+            outfile.write(self.profiler.to_json())
+        trace_filepath = self._get_document_sidecar_filepath(self.PROFILE_TRACE_FILE_SUFFIX)
+        with open(trace_filepath, 'w') as outfile:
+            outfile.write(self.profiler.to_chrome_trace())
+        self.log_info(f"Exported profile to {profile_filepath} and Chrome trace to {trace_filepath}")
 
     def scroll_log_to_bottom(self) -> None:
         vertical_scroll_bar = self.log_text_area.verticalScrollBar()
@@ -157,6 +529,35 @@ class ChooseYourOwnAnimation(DockWidget):
         for c in self.controls:
             c.setEnabled(True)
 
+    def set_frame_export_profile(self, profile: str) -> None:
+        if profile == self.frame_export_profile:
+            return
+        self.frame_export_profile = profile
+        self.log_info(f'Frames will be exported with the "{profile}" profile from the next reload.')
+        # Once the descriptor is loaded, the timeline in memory is complete, so it's safe to write a snapshot.
+        if self.get_active_document() and self.descriptor_signature is not None:
+            self._save_descriptor()
+
+    def _show_frame_export_profile(self) -> None:
+        self.frame_export_profile_combo_box.blockSignals(True)
+        self.frame_export_profile_combo_box.setCurrentText(self.frame_export_profile or
+                                                           self.DEFAULT_FRAME_EXPORT_PROFILE)
+        self.frame_export_profile_combo_box.blockSignals(False)
+
+    def _get_frame_export_profile(self) -> str:
+        """The profile chosen in the docker, or else the one saved in the descriptor."""
+        if self.frame_export_profile is None:
+            profile = self.DEFAULT_FRAME_EXPORT_PROFILE
+            try:
+                with open(self._get_descriptor_filepath(), 'r') as infile:
+                    profile = json.load(infile).get(self.KEY_FRAME_EXPORT_PROFILE, profile)
+            except (OSError, ValueError):
+                pass
+            self.frame_export_profile = profile if profile in self.FRAME_EXPORT_PROFILES else \
+                self.DEFAULT_FRAME_EXPORT_PROFILE
+            self._show_frame_export_profile()
+        return self.frame_export_profile
+
     def reload_from_file(self) -> None:
         active_document = self.get_active_document()
         if not active_document:
@@ -164,8 +565,10 @@ class ChooseYourOwnAnimation(DockWidget):
             return
 
         self.disable_controls()
+        self.stop_preview()
         if not os.path.exists(self._get_descriptor_filepath()):
-            self.descriptor_frames = []
+            self.timeline = Timeline()
+            self.descriptor_journal_sequence = 0
             self._save_descriptor()
 
         self.refresh_frame_index()
@@ -173,71 +576,390 @@ class ChooseYourOwnAnimation(DockWidget):
         frames_directory = self._get_frames_directory()
         if not os.path.exists(frames_directory):
             os.makedirs(frames_directory)
-            self._export_frames()
+        # Worked out now, since the active document may have changed by the time the job is closed.
+        self.job_scheduler.start(self._reload_job(frames_directory, self._get_export_manifest_filepath(),
+                                                  self._get_frame_export_profile()),
+                                 self._reload_finished)
+
+    def _reload_job(self, frames_directory: str, manifest_filepath: str, profile: str) -> Iterator[JobProgress]:
+        yield from self._export_frames_job(frames_directory, manifest_filepath, profile)
+        self._refresh_thumbnail_cache()
 
         self._load_descriptor()
-        self._regenerate_animation_layer()
+        yield from self._regenerate_animation_layer_job()
+
+    def _reload_finished(self, cancelled: bool) -> None:
+        if cancelled:
+            self.log_warning("Reload cancelled. Frames exported so far are kept, and the next reload continues "
+                             "from there. The Animation layer may be incomplete until then.")
+        self.progress_bar.reset()
+        self.progress_bar.setFormat("%p%")
         self.enable_controls()
 
+    def _show_job_progress(self, phase: str, done: int, total: int, seconds_left: float) -> None:
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+        eta = f", about {seconds_left:.0f}s left" if seconds_left >= 0 else ""
+        self.progress_bar.setFormat(f"{phase}: {done}/{total}{eta}")
+
+    @staticmethod
+    def run_job_to_completion(job: Iterator[JobProgress]) -> None:
+        for _ in job:
+            pass
+
     def _get_frames_directory(self) -> str:
         active_document = self.get_active_document()
         krita_directory = os.path.dirname(active_document.fileName())
         return os.path.join(krita_directory, self.DESCRIPTOR_FRAMES_DIRECTORY)
 
+    def _get_thumbnails_directory(self) -> str:
+        # Every project gets its own folder, so pruning one project's thumbnails never touches another's.
+        active_document = self.get_active_document()
+        krita_filename = os.path.basename(active_document.fileName())
+        krita_directory = os.path.dirname(active_document.fileName())
+        return os.path.join(krita_directory, self.THUMBNAILS_DIRECTORY, krita_filename)
+
+    def _refresh_thumbnail_cache(self) -> None:
+        thumbnails_directory = self._get_thumbnails_directory()
+        if not self.thumbnail_cache or self.thumbnail_cache.directory != thumbnails_directory:
+            self.thumbnail_cache = ThumbnailCache(thumbnails_directory)
+        removed_count = self.thumbnail_cache.prune(self.frame_name_to_fingerprint.values())
+        if removed_count:
+            self.log_info(f"Removed {removed_count} outdated thumbnail(s).")
+
     def _get_descriptor_filepath(self) -> str:
+        return self._get_document_sidecar_filepath(self.DESCRIPTOR_FILE_SUFFIX)
+
+    def _get_descriptor_journal_filepath(self) -> str:
+        return self._get_document_sidecar_filepath(self.DESCRIPTOR_JOURNAL_FILE_SUFFIX)
+
+    def _get_document_sidecar_filepath(self, suffix: str) -> str:
         active_document = self.get_active_document()
         krita_filename = os.path.basename(active_document.fileName())
-        descriptor_filename = krita_filename + self.DESCRIPTOR_FILE_SUFFIX
         krita_directory = os.path.dirname(active_document.fileName())
-        return os.path.join(krita_directory, descriptor_filename)
+        return os.path.join(krita_directory, krita_filename + suffix)
+
+    def _get_descriptor_signature(self) -> Optional[Tuple[int, int]]:
+        """The descriptor's modification time and the journal's size, which change whenever either is written."""
+        try:
+            descriptor_mtime = os.stat(self._get_descriptor_filepath()).st_mtime_ns
+        except OSError:
+            return None
+        journal_filepath = self._get_descriptor_journal_filepath()
+        journal_size = os.path.getsize(journal_filepath) if os.path.exists(journal_filepath) else -1
+        return descriptor_mtime, journal_size
 
     def _save_descriptor(self) -> None:
+        """Write a full snapshot of the descriptor, which also compacts the journal into it."""
         descriptor = {self.KEY_FRAMES_DIRECTORY: self.DESCRIPTOR_FRAMES_DIRECTORY,
                       self.KEY_FRAMES_PER_SECOND: self.get_active_document().framesPerSecond(),
-                      self.KEY_FRAMES_LIST: self.descriptor_frames}
-        with open(self._get_descriptor_filepath(), 'w') as outfile:
-            json.dump(descriptor, outfile, indent=1, separators=(', ', ': '))
+                      self.KEY_FRAME_EXPORT_PROFILE: self._get_frame_export_profile(),
+                      self.KEY_JOURNAL_SEQUENCE: self.descriptor_journal_sequence,
+                      self.KEY_FRAMES_LIST: [self.timeline_entry_to_descriptor_frame(e) for e in self.timeline]}
+        self.write_file_atomically(self._get_descriptor_filepath(),
+                                   json.dumps(descriptor, indent=1, separators=(', ', ': ')))
+
+        # The snapshot is in place before the journal goes away. If we crash in between, replaying the journal
+        # skips every record the snapshot already contains, because of the sequence number.
+        journal_filepath = self._get_descriptor_journal_filepath()
+        if os.path.exists(journal_filepath):
+            os.remove(journal_filepath)
+        self.descriptor_journal_length = 0
+        self.descriptor_signature = self._get_descriptor_signature()
         self._update_animation_times()
 
+    def _append_descriptor_entries(self, entries: List[TimelineEntry]) -> None:
+        """Append entries to the descriptor by writing one small journal record per entry."""
+        records = []
+        for entry in entries:
+            self.timeline.append(entry.frame_name, entry.duration)
+            records.append(self._create_journal_record(self.JOURNAL_OPERATION_APPEND,
+                                                       self.timeline_entry_to_descriptor_frame(entry)))
+        self._write_descriptor_journal_records(records)
+
+    def _edit_descriptor(self, operation: str, fields: Dict) -> None:
+        """Apply one insert, delete or retime to the timeline, and journal it. Raises on an invalid edit."""
+        self._apply_descriptor_operation(operation, fields)
+        self._write_descriptor_journal_records([self._create_journal_record(operation, fields)])
+
+    def _create_journal_record(self, operation: str, fields: Dict) -> Dict:
+        self.descriptor_journal_sequence += 1
+        return {self.KEY_JOURNAL_RECORD_SEQUENCE: self.descriptor_journal_sequence,
+                self.KEY_JOURNAL_RECORD_OPERATION: operation,
+                **fields}
+
+    def _write_descriptor_journal_records(self, records: List[Dict]) -> None:
+        with open(self._get_descriptor_journal_filepath(), 'a') as outfile:
+            outfile.write("".join(json.dumps(record) + "\n" for record in records))
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        self.descriptor_journal_length += len(records)
+        self.descriptor_signature = self._get_descriptor_signature()
+
+        if self.descriptor_journal_length >= self.DESCRIPTOR_JOURNAL_COMPACTION_THRESHOLD:
+            self._save_descriptor()
+        else:
+            self._update_animation_times()
+
     def _load_descriptor(self) -> None:
         with open(self._get_descriptor_filepath(), 'r') as outfile:
             descriptor = json.load(outfile)
             self.get_active_document().setFramesPerSecond(descriptor[self.KEY_FRAMES_PER_SECOND])
-            self.descriptor_frames = descriptor[self.KEY_FRAMES_LIST]
+            self.timeline = Timeline(self.descriptor_frame_to_timeline_entry(frame)
+                                     for frame in descriptor[self.KEY_FRAMES_LIST])
+            self.descriptor_journal_sequence = descriptor.get(self.KEY_JOURNAL_SEQUENCE, 0)
+            saved_frame_export_profile = descriptor.get(self.KEY_FRAME_EXPORT_PROFILE)
+
+        replayed_count = self._replay_descriptor_journal()
+        if replayed_count or os.path.exists(self._get_descriptor_journal_filepath()):
+            # Compacting right away also drops any torn record, so later appends never follow a partial line.
+            self.log_info(f"Replayed {replayed_count} descriptor journal record(s).")
+            self._save_descriptor()
+        elif saved_frame_export_profile != self._get_frame_export_profile():
+            self._save_descriptor()
+        self.descriptor_signature = self._get_descriptor_signature()
         self._update_animation_times()
 
-        ending_frame_name = self.descriptor_frames[-1][self.KEY_FRAMES_LIST_FRAME_KEY] if self.descriptor_frames else ""
+        ending_frame_name = self.timeline.last().frame_name if self.timeline else ""
         self.update_current_frame_name(ending_frame_name)
 
+    def _replay_descriptor_journal(self) -> int:
+        journal_filepath = self._get_descriptor_journal_filepath()
+        if not os.path.exists(journal_filepath):
+            return 0
+
+        replayed_count = 0
+        with open(journal_filepath, 'r') as infile:
+            for line in infile:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    self.log_warning("Descriptor journal ends in an incomplete record. Ignoring it.")
+                    break
+                sequence = record.pop(self.KEY_JOURNAL_RECORD_SEQUENCE)
+                operation = record.pop(self.KEY_JOURNAL_RECORD_OPERATION)
+                if sequence <= self.descriptor_journal_sequence:
+                    continue
+                try:
+                    if not self._apply_descriptor_operation(operation, record):
+                        self.log_warning(f"Skipping unknown descriptor journal operation: {operation}")
+                except (IndexError, ValueError) as e:
+                    self.log_warning(f"Skipping descriptor journal record {sequence} that doesn't fit: {e}")
+                self.descriptor_journal_sequence = sequence
+                replayed_count += 1
+        return replayed_count
+
+    def _apply_descriptor_operation(self, operation: str, fields: Dict) -> bool:
+        """Apply a journaled operation to the timeline, returning False if the operation is unknown."""
+        if operation == self.JOURNAL_OPERATION_APPEND:
+            entry = self.descriptor_frame_to_timeline_entry(fields)
+            self.timeline.append(entry.frame_name, entry.duration)
+        elif operation == self.JOURNAL_OPERATION_INSERT:
+            entry = self.descriptor_frame_to_timeline_entry(fields)
+            self.timeline.insert(fields[self.KEY_JOURNAL_RECORD_INDEX], entry.frame_name, entry.duration)
+        elif operation == self.JOURNAL_OPERATION_DELETE:
+            self.timeline.delete(fields[self.KEY_JOURNAL_RECORD_INDEX])
+        elif operation == self.JOURNAL_OPERATION_RETIME:
+            self.timeline.set_duration(fields[self.KEY_JOURNAL_RECORD_INDEX],
+                                       fields[self.KEY_FRAMES_LIST_FRAME_DURATION])
+        else:
+            return False
+        return True
+
+    def timeline_entry_to_descriptor_frame(self, entry: TimelineEntry) -> Dict:
+        return {self.KEY_FRAMES_LIST_FRAME_KEY: entry.frame_name,
+                self.KEY_FRAMES_LIST_FRAME_DURATION: entry.duration}
+
+    def descriptor_frame_to_timeline_entry(self, frame: Dict) -> TimelineEntry:
+        return TimelineEntry(frame[self.KEY_FRAMES_LIST_FRAME_KEY], frame[self.KEY_FRAMES_LIST_FRAME_DURATION])
+
+    @staticmethod
+    def write_file_atomically(filepath: str, contents: str) -> None:
+        temporary_filepath = filepath + ".tmp"
+        with open(temporary_filepath, 'w') as outfile:
+            outfile.write(contents)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(temporary_filepath, filepath)
+
     def _update_animation_times(self) -> None:
         self.get_active_document().setFullClipRangeStartTime(0)
         self.get_active_document().setFullClipRangeEndTime(self.calculate_animation_end_time())
 
     def calculate_animation_end_time(self) -> int:
-        frame_count = self._get_frame_count()
+        frame_count = self.timeline.frame_count
         return frame_count - 1 if frame_count > 0 else 0
 
     def update_current_frame_name(self, frame_name: str) -> None:
         self.current_frame_name_widget.setText(frame_name)
         self.refresh_choices()
-
-    def _get_frame_count(self) -> int:
-        return sum([frame[self.KEY_FRAMES_LIST_FRAME_DURATION] for frame in self.descriptor_frames])
-
-    def _export_frames(self) -> None:
-        full_names_filepath = os.path.join(self._get_frames_directory(), self.FRAME_FULL_NAME_FILENAME)
-        full_names = {frame_name: node.name() for frame_name, node in self.frame_name_to_node.items()}
+        self._update_preview_sequence()
+
+    def _export_frames_job(self, frames_directory: str, manifest_filepath: str, profile: str) -> Iterator[JobProgress]:
+        """
+        Export the frames of the active document. The paths and profile are passed in rather than looked up, because
+        a cancelled job saves its manifest after Krita has already switched to another document.
+        """
+        full_names_filepath = os.path.join(frames_directory, self.FRAME_FULL_NAME_FILENAME)
+        full_names = {frame_name: node.name() for frame_name, node in self.frame_graph.frames()}
         with open(full_names_filepath, 'w') as outfile:
             json.dump(full_names, outfile)
 
-        for frame_name, node in self.frame_name_to_node.items():
-            self.export_node(self.get_active_document(), node, self.frame_name_to_filepath(frame_name))
+        # Only frames that are new, renamed, or whose pixels changed since the last export get written again.
+        # The manifest is saved as we go, so an export that is cancelled or crashes resumes where it stopped.
+        previous_profile, previous_manifest = self._load_export_manifest(manifest_filepath)
+        # Every frame exported with another profile is out of date, but still ours to remove if it's orphaned.
+        up_to_date_manifest = previous_manifest if previous_profile == profile else {}
+        partial_manifest = dict(up_to_date_manifest)
+        fingerprint_to_filepath = {fingerprint: self.frame_name_to_filepath(frame_name, frames_directory)
+                                   for frame_name, fingerprint in up_to_date_manifest.items()}
+        manifest: Dict[str, str] = {}
+        export_counts = Counter()
+        frame_count = len(self.frame_graph)
+        try:
+            for frame_name, node in self.frame_graph.frames():
+                fingerprint = self.calculate_node_fingerprint(node)
+                manifest[frame_name] = fingerprint
+                filepath = self.frame_name_to_filepath(frame_name, frames_directory)
+                if up_to_date_manifest.get(frame_name) != fingerprint or not os.path.exists(filepath):
+                    partial_manifest.pop(frame_name, None)
+                    self._write_frame_file(node, filepath, profile, fingerprint, up_to_date_manifest.get(frame_name),
+                                           fingerprint_to_filepath, export_counts)
+                    if sum(export_counts[key] for key in ("encoded", "duplicates")) % \
+                            self.EXPORT_MANIFEST_SAVE_INTERVAL == 0:
+                        self._save_export_manifest(manifest_filepath, profile, partial_manifest)
+                partial_manifest[frame_name] = fingerprint
+                yield JobProgress(self.PHASE_EXPORTING, len(manifest), frame_count)
+        except GeneratorExit:
+            self._save_export_manifest(manifest_filepath, profile, partial_manifest)
+            self.frame_name_to_fingerprint = partial_manifest
+            self.log_info(f"Exported {export_counts['encoded'] + export_counts['duplicates']} frame(s) "
+                          f"before stopping.")
+            raise
+
+        # Only files this project exported are removed, and only once no other project's manifest still lists them,
+        # since the frames directory may be shared between projects.
+        removed_count = 0
+        orphaned_frame_names = previous_manifest.keys() - manifest.keys()
+        if orphaned_frame_names:
+            orphaned_frame_names -= self._get_frame_names_of_other_projects(manifest_filepath)
+        for frame_name in orphaned_frame_names:
+            orphaned_filepath = self.frame_name_to_filepath(frame_name, frames_directory)
+            if os.path.exists(orphaned_filepath):
+                os.remove(orphaned_filepath)
+                removed_count += 1
+
+        self._save_export_manifest(manifest_filepath, profile, manifest)
+        self.frame_name_to_fingerprint = manifest
+        self.log_info(f"Exported {export_counts['encoded'] + export_counts['duplicates']} of {len(manifest)} "
+                      f"frame(s), removed {removed_count} orphaned frame(s).")
+        self._log_export_counts(profile, export_counts)
+
+    def _export_new_frames(self, frame_names: List[str]) -> None:
+        """Export frames that appeared since the last reload, so they can be appended before the next one."""
+        profile = self._get_frame_export_profile()
+        manifest = dict(self.frame_name_to_fingerprint)
+        fingerprint_to_filepath = {fingerprint: self.frame_name_to_filepath(frame_name)
+                                   for frame_name, fingerprint in manifest.items()}
+        export_counts = Counter()
+        for frame_name in frame_names:
+            node = self.frame_graph.handle(frame_name)
+            fingerprint = self.calculate_node_fingerprint(node)
+            filepath = self.frame_name_to_filepath(frame_name)
+            if manifest.get(frame_name) != fingerprint or not os.path.exists(filepath):
+                self._write_frame_file(node, filepath, profile, fingerprint, manifest.get(frame_name),
+                                       fingerprint_to_filepath, export_counts)
+            manifest[frame_name] = fingerprint
+        self._save_export_manifest(self._get_export_manifest_filepath(), profile, manifest)
+        self.frame_name_to_fingerprint = manifest
+        self._log_export_counts(profile, export_counts)
+
+    def _write_frame_file(self, node: Node, filepath: str, profile: str, fingerprint: str,
+                          previous_fingerprint: Optional[str], fingerprint_to_filepath: Dict[str, str],
+                          export_counts: Counter) -> None:
+        """
+        Write a frame's file with the given frame export profile. A frame with the same pixels as one already written
+        is hard linked to that file, or copied where links aren't supported, instead of being encoded again.
+        """
+        # The file is about to stop holding its previous pixels, so nothing else should be linked to it for them.
+        if fingerprint_to_filepath.get(previous_fingerprint) == filepath:
+            del fingerprint_to_filepath[previous_fingerprint]
+        # Never write through a hard link, which would change every frame sharing the file.
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+        existing_filepath = fingerprint_to_filepath.get(fingerprint)
+        if existing_filepath and os.path.exists(existing_filepath):
+            try:
+                os.link(existing_filepath, filepath)
+            except OSError:
+                shutil.copyfile(existing_filepath, filepath)
+            export_counts["duplicates"] += 1
+            self.log_debug(f"Linked duplicate: {filepath} to {existing_filepath}")
+            return
+
+        start_time = time.perf_counter()
+        self.export_node(self.get_active_document(), node, filepath, profile)
+        export_counts["encode_seconds"] += time.perf_counter() - start_time
+        export_counts["encoded"] += 1
+        if os.path.exists(filepath):
+            export_counts["bytes_written"] += os.path.getsize(filepath)
+            fingerprint_to_filepath[fingerprint] = filepath
+
+    def _log_export_counts(self, profile: str, export_counts: Counter) -> None:
+        if not export_counts["encoded"] and not export_counts["duplicates"]:
+            return
+        self.log_info(f'Encoded {export_counts["encoded"]} frame(s) with the "{profile}" profile in '
+                      f'{export_counts["encode_seconds"]:.1f}s, writing {export_counts["bytes_written"] / 1e6:.1f} MB. '
+                      f'Linked {export_counts["duplicates"]} duplicate frame(s) instead of encoding them.')
+
+    def _get_export_manifest_filepath(self) -> str:
+        krita_filename = os.path.basename(self.get_active_document().fileName())
+        return os.path.join(self._get_frames_directory(), krita_filename + self.EXPORT_MANIFEST_FILE_SUFFIX)
+
+    def _get_frame_names_of_other_projects(self, manifest_filepath: str) -> Set[str]:
+        """Every frame listed in the export manifest of another project sharing the frames directory."""
+        frames_directory, own_manifest_filename = os.path.split(manifest_filepath)
+        frame_names: Set[str] = set()
+        for filename in os.listdir(frames_directory):
+            if filename.endswith(self.EXPORT_MANIFEST_FILE_SUFFIX) and filename != own_manifest_filename:
+                _, frames = self._load_export_manifest(os.path.join(frames_directory, filename))
+                frame_names.update(frames)
+        return frame_names
+
+    def _load_export_manifest(self, manifest_filepath: str) -> Tuple[Optional[str], Dict[str, str]]:
+        """The profile the frames were exported with, and the fingerprint of every exported frame."""
+        if not os.path.exists(manifest_filepath):
+            return None, {}
+        try:
+            with open(manifest_filepath, 'r') as infile:
+                manifest = json.load(infile)
+        except ValueError:
+            self.log_warning(f"Export manifest {os.path.basename(manifest_filepath)} is unreadable. Ignoring it.")
+            return None, {}
+        return manifest[self.KEY_EXPORT_MANIFEST_PROFILE], manifest[self.KEY_EXPORT_MANIFEST_FRAMES]
+
+    def _save_export_manifest(self, manifest_filepath: str, profile: str, frames: Dict[str, str]) -> None:
+        manifest = {self.KEY_EXPORT_MANIFEST_PROFILE: profile,
+                    self.KEY_EXPORT_MANIFEST_FRAMES: frames}
+        with open(manifest_filepath, 'w') as outfile:
+            json.dump(manifest, outfile, indent=1, separators=(', ', ': '))
 
-    def export_node(self, document: Document, node: Node, filepath: str) -> None:
+    @staticmethod
+    def calculate_node_fingerprint(node: Node) -> str:
+        """A hash of the pixels and bounds only, so frames that look the same have the same fingerprint."""
+        bounds = node.bounds()
+        x, y, width, height = bounds.x(), bounds.y(), bounds.width(), bounds.height()
+        fingerprint = hashlib.blake2b(digest_size=16)
+        fingerprint.update(f"{x},{y},{width},{height}".encode("utf-8"))
+        fingerprint.update(bytes(node.pixelData(x, y, width, height)))
+        return fingerprint.hexdigest()
+
+    def export_node(self, document: Document, node: Node, filepath: str, profile: str) -> None:
         resolution = document.resolution()
         info = InfoObject()
         info.setProperty("alpha", True)
-        info.setProperty("compression", 9)
+        info.setProperty("compression", self.FRAME_EXPORT_PROFILES[profile])
         info.setProperty("forceSRGB", False)
         info.setProperty("indexed", False)
         info.setProperty("interlaced", False)
@@ -245,82 +967,214 @@ class ChooseYourOwnAnimation(DockWidget):
         info.setProperty("transparencyFillcolor", [0, 0, 0])
 
         Krita.instance().setBatchmode(True)
-        self.log_info(f"Exporting: {filepath}")
-        node.save(filepath, resolution, resolution, info)
-        self.log_info(f"Exported: {filepath}")
+        self.log_debug(f"Exporting: {filepath}")
+        with self.profiler.span("export_frame"):
+            node.save(filepath, resolution, resolution, info)
+        self.log_debug(f"Exported: {filepath}")
         Krita.instance().setBatchmode(False)
 
     def _regenerate_animation_layer(self) -> None:
-        active_document = self.get_active_document()
-        frames_group = active_document.nodeByName(self.FRAMES_ROOT_LAYER_NAME)
-        frames_group.setVisible(False)
-        background_layer = active_document.nodeByName(self.BACKGROUND_LAYER_NAME)
+        self.run_job_to_completion(self._regenerate_animation_layer_job())
+
+    def _regenerate_animation_layer_job(self) -> Iterator[JobProgress]:
+        with self.profiler.span("regenerate"):
+            active_document = self.get_active_document()
+            frames_group = active_document.nodeByName(self.FRAMES_ROOT_LAYER_NAME)
+            frames_group.setVisible(False)
+            background_layer = active_document.nodeByName(self.BACKGROUND_LAYER_NAME)
+
+            self.log_info("Generating animation...")
+            sources_group = self._reset_source_layers(active_document)
+            # The old performance layer's clones point at the sources just removed. It goes before the first step,
+            # so that if this is cancelled, the next append notices it's missing and regenerates instead of using it.
+            self.remove_layer_if_exists(active_document, self.PERFORMANCE_ROOT_LAYER_NAME)
+            self.remove_layer_if_exists(active_document, self.ANIMATION_ROOT_LAYER_NAME)
+            animation_layer = active_document.createGroupLayer(self.ANIMATION_ROOT_LAYER_NAME)
+            active_document.rootNode().addChildNode(animation_layer, frames_group)
+            yield from self._regenerate_child_layers_job(active_document, sources_group, animation_layer)
+
+            performance_layer = animation_layer.clone()
+            performance_layer.setName(self.PERFORMANCE_ROOT_LAYER_NAME)
+            performance_layer.setVisible(False)
+            performance_layer.setCollapsed(True)
+            active_document.rootNode().addChildNode(performance_layer, background_layer)
+
+            active_document.setActiveNode(animation_layer)
+            animation_layer.setPinnedToTimeline(True)
+
+            self._set_last_animation_frame_visible(animation_layer, True)
+            # self.do_krita_action('convert_group_to_animated')
+            # active_document.setCurrentTime(self.calculate_animation_end_time())
+            self._log_source_layer_reuse()
+            self.log_info("Animation generated.")
 
-        self.log_info("Generating animation...")
-        self.remove_layer_if_exists(active_document, self.ANIMATION_ROOT_LAYER_NAME)
-        animation_layer = active_document.createGroupLayer(self.ANIMATION_ROOT_LAYER_NAME)
-        active_document.rootNode().addChildNode(animation_layer, frames_group)
-        self._regenerate_child_layers(active_document, animation_layer)
+    def _append_animation_frames(self, frame_name: str, duration: int) -> None:
+        self._append_animation_entries([TimelineEntry(frame_name, duration)])
 
-        self.remove_layer_if_exists(active_document, self.PERFORMANCE_ROOT_LAYER_NAME)
-        performance_layer = animation_layer.clone()
-        performance_layer.setName(self.PERFORMANCE_ROOT_LAYER_NAME)
-        performance_layer.setVisible(False)
-        performance_layer.setCollapsed(True)
-        active_document.rootNode().addChildNode(performance_layer, background_layer)
+    def _append_animation_entries(self, entries: List[TimelineEntry]) -> None:
+        """Append entries with a single descriptor write and a single update of the animation layers."""
+        with self.profiler.span("append"):
+            if len(entries) == 1:
+                self.log_info(f"Appending {entries[0].duration} frame(s): {entries[0].frame_name}")
+            else:
+                self.log_info(f"Appending {sum(entry.duration for entry in entries)} frame(s) "
+                              f"from {len(entries)} picks.")
 
-        active_document.setActiveNode(animation_layer)
+            active_document = self.get_active_document()
+            performance_layer = active_document.nodeByName(self.PERFORMANCE_ROOT_LAYER_NAME)
+            if not performance_layer:
+                self.log_warning("Performance layer expected but not found. Regenerating.")
+                self._regenerate_animation_layer()
+                performance_layer = active_document.nodeByName(self.PERFORMANCE_ROOT_LAYER_NAME)
+
+            frame_insert_index = self.timeline.frame_count
+            self._append_descriptor_entries(entries)
+            sources_group = self._get_sources_group(active_document)
+            new_child_nodes = []
+            for frame_name, duration in entries:
+                new_child_nodes.extend(self._create_child_nodes(active_document, sources_group, frame_name, duration,
+                                                                frame_insert_index))
+                frame_insert_index += duration
+
+            # Only the last chunk can have room left, so appending only touches that chunk and the new ones after it.
+            performance_chunks = performance_layer.childNodes()
+            first_changed_chunk_index = len(performance_chunks)
+            if performance_chunks:
+                open_chunk = performance_chunks[-1]
+                open_chunk_children = open_chunk.childNodes()
+                room = self.ANIMATION_CHUNK_FRAME_COUNT - len(open_chunk_children)
+                if room > 0:
+                    first_changed_chunk_index -= 1
+                    self.append_child_nodes(open_chunk, new_child_nodes[:room])
+                    new_child_nodes = new_child_nodes[room:]
+            new_chunks = self._create_chunk_layers(active_document, new_child_nodes, len(performance_chunks))
+            self.append_child_nodes(performance_layer, new_chunks)
+            self._update_animation_chunks(active_document, performance_layer, len(performance_chunks),
+                                          first_changed_chunk_index)
+            # self.do_krita_action('convert_group_to_animated')
+            # active_document.setCurrentTime(self.calculate_animation_end_time())
+            self._log_source_layer_reuse()
+            self.log_info(f"Appended.")
+
+    def _update_animation_chunks(self, document: Document, performance_layer: Node, previous_chunk_count: int,
+                                 first_changed_chunk_index: int) -> None:
+        """Bring the Animation layer in line with the performance layer by cloning only the chunks that changed."""
+        animation_layer = document.nodeByName(self.ANIMATION_ROOT_LAYER_NAME)
+        if animation_layer and self._is_chunked_like(animation_layer, previous_chunk_count):
+            self._set_last_animation_frame_visible(animation_layer, False)
+            for chunk in animation_layer.childNodes()[first_changed_chunk_index:]:
+                chunk.remove()
+            changed_chunks = performance_layer.childNodes()[first_changed_chunk_index:]
+            self.append_child_nodes(animation_layer, [chunk.clone() for chunk in changed_chunks])
+        else:
+            self.log_warning("Animation layer doesn't match the performance layer. Cloning all of it.")
+            self.remove_layer_if_exists(document, self.ANIMATION_ROOT_LAYER_NAME)
+            animation_layer = performance_layer.clone()
+            animation_layer.setName(self.ANIMATION_ROOT_LAYER_NAME)
+            animation_layer.setVisible(True)
+            frames_group = document.nodeByName(self.FRAMES_ROOT_LAYER_NAME)
+            document.rootNode().addChildNode(animation_layer, frames_group)
+
+        document.setActiveNode(animation_layer)
         animation_layer.setPinnedToTimeline(True)
+        # animation_layer.setCollapsed(False)
 
-        if animation_layer.childNodes():
-            animation_layer.childNodes()[-1].setVisible(True)
-        # self.do_krita_action('convert_group_to_animated')
-        # active_document.setCurrentTime(self.calculate_animation_end_time())
-        self.log_info("Animation generated.")
-
-    def _append_animation_frames(self, frame_name: str, duration: int) -> None:
-        self.log_info(f"Appending {duration} frame(s): {frame_name}")
+        self._set_last_animation_frame_visible(animation_layer, True)
 
-        active_document = self.get_active_document()
-        performance_layer = active_document.nodeByName(self.PERFORMANCE_ROOT_LAYER_NAME)
-        if not performance_layer:
-            self.log_warning("Performance layer expected but not found. Regenerating.")
-            self._regenerate_animation_layer()
+    def _rebuild_animation_from_time(self, first_changed_time: int) -> None:
+        """
+        After the timeline changed at `first_changed_time`, rebuild the chunks from the one holding that frame to the
+        end. Every chunk before it is full and unchanged, so the cost is only that of the frames after the edit.
+        """
+        with self.profiler.span("edit"):
+            active_document = self.get_active_document()
             performance_layer = active_document.nodeByName(self.PERFORMANCE_ROOT_LAYER_NAME)
+            if not performance_layer:
+                self.log_warning("Performance layer expected but not found. Regenerating.")
+                self._regenerate_animation_layer()
+                return
+
+            performance_chunks = performance_layer.childNodes()
+            first_changed_chunk_index = min(first_changed_time // self.ANIMATION_CHUNK_FRAME_COUNT,
+                                            len(performance_chunks))
+            for chunk in performance_chunks[first_changed_chunk_index:]:
+                chunk.remove()
+
+            rebuild_start_time = first_changed_chunk_index * self.ANIMATION_CHUNK_FRAME_COUNT
+            sources_group = self._get_sources_group(active_document)
+            child_nodes = []
+            if rebuild_start_time < self.timeline.frame_count:
+                for index in range(self.timeline.index_at_time(rebuild_start_time), len(self.timeline)):
+                    frame_name, duration = self.timeline[index]
+                    entry_start_time = self.timeline.start_time(index)
+                    start_time = max(entry_start_time, rebuild_start_time)
+                    child_nodes.extend(self._create_child_nodes(active_document, sources_group, frame_name,
+                                                                entry_start_time + duration - start_time, start_time))
+            new_chunks = self._create_chunk_layers(active_document, child_nodes, first_changed_chunk_index)
+            self.append_child_nodes(performance_layer, new_chunks)
+            self._update_animation_chunks(active_document, performance_layer, len(performance_chunks),
+                                          first_changed_chunk_index)
+            self.log_info(f"Rebuilt {len(child_nodes)} frame layer(s) in {len(new_chunks)} chunk(s).")
+
+    def _is_chunked_like(self, animation_layer: Node, previous_chunk_count: int) -> bool:
+        animation_chunks = animation_layer.childNodes()
+        if len(animation_chunks) != previous_chunk_count:
+            return False
+        return all(chunk.type() == self.GROUP_LAYER_TYPE for chunk in animation_chunks[-1:])
 
-        frame_insert_index = self._get_frame_count()
-        self.descriptor_frames.append({
-            self.KEY_FRAMES_LIST_FRAME_KEY: frame_name,
-            self.KEY_FRAMES_LIST_FRAME_DURATION: duration,
-        })
-        self._save_descriptor()
-        new_child_nodes = self._create_child_nodes(active_document, frame_name, duration, frame_insert_index)
+    @staticmethod
+    def _set_last_animation_frame_visible(animation_layer: Node, visible: bool) -> None:
+        chunks = animation_layer.childNodes()
+        last_chunk_children = chunks[-1].childNodes() if chunks else []
+        if last_chunk_children:
+            last_chunk_children[-1].setVisible(visible)
 
-        # Work around bug in "setChildNodes(performance_layer.childNodes() + new_child_nodes)"
+    @staticmethod
+    def append_child_nodes(parent: Node, child_nodes: List[Node]) -> None:
+        # Work around bug in "setChildNodes(parent.childNodes() + child_nodes)"
         # Somehow trying to use setChildNodes allows the 0 index item to migrate to before the new nodes.
         # https://bugs.kde.org/show_bug.cgi?id=446811
-        prev_child_nodes = performance_layer.childNodes()
+        prev_child_nodes = parent.childNodes()
         prev_node = prev_child_nodes[-1] if prev_child_nodes else None
-        for node in new_child_nodes:
-            performance_layer.addChildNode(node, prev_node)
+        for node in child_nodes:
+            parent.addChildNode(node, prev_node)
             prev_node = node
 
-        self.remove_layer_if_exists(active_document, self.ANIMATION_ROOT_LAYER_NAME)
-        animation_layer = performance_layer.clone()
-        animation_layer.setName(self.ANIMATION_ROOT_LAYER_NAME)
-        animation_layer.setVisible(True)
+    def _create_chunk_layers(self, document: Document, child_nodes: List[Node], first_chunk_index: int) -> List[Node]:
+        chunks = []
+        for offset in range(0, len(child_nodes), self.ANIMATION_CHUNK_FRAME_COUNT):
+            chunk_index = first_chunk_index + len(chunks)
+            chunk = document.createGroupLayer(f"{self.ANIMATION_CHUNK_LAYER_NAME_PREFIX}{chunk_index}")
+            chunk.setChildNodes(child_nodes[offset:offset + self.ANIMATION_CHUNK_FRAME_COUNT])
+            chunk.setCollapsed(True)
+            chunks.append(chunk)
+        return chunks
+
+    def flatten_animation_layer(self) -> None:
+        """
+        Rebuild the Animation layer without chunks, so that Layer > Convert turns each child into one frame. The
+        flattened layer holds its own file layers, so it still works after being renamed and the plugin replaces
+        "Animation_Sources".
+        """
+        active_document = self.get_active_document()
+        if not active_document:
+            self.log_error("Make or open a document.")
+            return
+
+        self.disable_controls()
+        self.log_info("Flattening animation...")
         frames_group = active_document.nodeByName(self.FRAMES_ROOT_LAYER_NAME)
+        self.remove_layer_if_exists(active_document, self.ANIMATION_ROOT_LAYER_NAME)
+        animation_layer = active_document.createGroupLayer(self.ANIMATION_ROOT_LAYER_NAME)
         active_document.rootNode().addChildNode(animation_layer, frames_group)
-
+        child_nodes = self._create_flattened_child_nodes(active_document)
+        animation_layer.setChildNodes(child_nodes)
+        if child_nodes:
+            child_nodes[-1].setVisible(True)
         active_document.setActiveNode(animation_layer)
         animation_layer.setPinnedToTimeline(True)
-        # animation_layer.setCollapsed(False)
-
-        if animation_layer.childNodes():
-            animation_layer.childNodes()[-1].setVisible(True)
-        # self.do_krita_action('convert_group_to_animated')
-        # active_document.setCurrentTime(self.calculate_animation_end_time())
-        self.log_info(f"Appended.")
+        self.log_info("Animation flattened. Rename it, then use Layer > Convert > Convert group to animated layer.")
+        self.enable_controls()
 
     @staticmethod
     def remove_layer_if_exists(document: Document, layer_name: str) -> None:
@@ -328,101 +1182,303 @@ class ChooseYourOwnAnimation(DockWidget):
         if layer:
             layer.remove()
 
-    def _regenerate_child_layers(self, document: Document, root_animation_layer: Node) -> None:
-        current_frame = 0
+    def _regenerate_child_layers_job(self, document: Document, sources_group: Node,
+                                     root_animation_layer: Node) -> Iterator[JobProgress]:
         child_nodes = []
-        for frame in self.descriptor_frames:
-            frame_name = frame[self.KEY_FRAMES_LIST_FRAME_KEY]
-            duration = frame[self.KEY_FRAMES_LIST_FRAME_DURATION]
-            child_nodes.extend(self._create_child_nodes(document, frame_name, duration, current_frame))
-            current_frame += duration
-        root_animation_layer.setChildNodes(child_nodes)
-
-    def _create_child_nodes(self, active_document: Document, frame_name: str, duration: int, current_frame: int):
-        frame_count = self._get_frame_count()
-        frame_count_digits = len(str(frame_count))
+        yield from self._create_timeline_child_nodes_job(document, sources_group, child_nodes)
+        root_animation_layer.setChildNodes(self._create_chunk_layers(document, child_nodes, 0))
+
+    def _create_flattened_child_nodes(self, document: Document) -> List[Node]:
+        """The first use of each frame is a file layer, and every later use is a clone of that file layer."""
+        child_nodes = []
+        frame_name_to_file_layer: Dict[str, Node] = {}
+        for frame_name, duration in self.timeline:
+            for _ in range(duration):
+                layer_name = str(len(child_nodes)).zfill(self.ANIMATION_FRAME_LAYER_NAME_DIGITS)
+                file_layer = frame_name_to_file_layer.get(frame_name)
+                if file_layer:
+                    child_node = document.createCloneLayer(layer_name, file_layer)
+                else:
+                    child_node = document.createFileLayer(layer_name, self.frame_name_to_filepath(frame_name),
+                                                          self.SCALING_METHOD_NONE)
+                    frame_name_to_file_layer[frame_name] = child_node
+                child_node.setVisible(False)
+                child_nodes.append(child_node)
+        return child_nodes
+
+    def _create_timeline_child_nodes_job(self, document: Document, sources_group: Node,
+                                         child_nodes: List[Node]) -> Iterator[JobProgress]:
+        """Create the child nodes of every timeline entry into `child_nodes`, one entry per step."""
+        for index, (frame_name, duration) in enumerate(self.timeline):
+            start_time = self.timeline.start_time(index)
+            child_nodes.extend(self._create_child_nodes(document, sources_group, frame_name, duration, start_time))
+            yield JobProgress(self.PHASE_GENERATING, index + 1, len(self.timeline))
+
+    def _create_child_nodes(self, active_document: Document, sources_group: Node, frame_name: str, duration: int,
+                            current_frame: int):
         child_nodes = []
-        frame_filepath = self.frame_name_to_filepath(frame_name)
-        previous_layer = None
+        source_layer = self._get_source_layer(active_document, sources_group, frame_name)
         for i in range(0, duration):
-            layer_name = str(current_frame).zfill(frame_count_digits)
-            if i == 0:
-                file_layer = active_document.createFileLayer(layer_name, frame_filepath, self.SCALING_METHOD_NONE)
-                previous_layer = file_layer
-            else:
-                file_layer = active_document.createCloneLayer(layer_name, previous_layer)
-            file_layer.setVisible(False)
-            child_nodes.append(file_layer)
+            layer_name = str(current_frame).zfill(self.ANIMATION_FRAME_LAYER_NAME_DIGITS)
+            clone_layer = active_document.createCloneLayer(layer_name, source_layer)
+            clone_layer.setVisible(False)
+            child_nodes.append(clone_layer)
             current_frame += 1
         return child_nodes
 
-    def frame_name_to_filepath(self, frame_name: str) -> str:
-        return os.path.join(self._get_frames_directory(), frame_name + ".png")
+    def _get_sources_group(self, document: Document) -> Node:
+        """
+        The group holding the source layers. It's looked up once per append or rebuild rather than once per entry,
+        since the search passes through the whole animation.
+        """
+        sources_group = document.nodeByName(self.SOURCES_ROOT_LAYER_NAME)
+        return sources_group if sources_group else self._reset_source_layers(document)
+
+    def _get_source_layer(self, document: Document, sources_group: Node, frame_name: str) -> Node:
+        """The one file layer for a frame, which every use of the frame in the animation is a clone of."""
+        source_layer = self.frame_name_to_source_layer.get(frame_name)
+        if not source_layer:
+            frame_filepath = self.frame_name_to_filepath(frame_name)
+            source_layer = document.createFileLayer(self.SOURCE_LAYER_NAME_PREFIX + frame_name, frame_filepath,
+                                                    self.SCALING_METHOD_NONE)
+            source_layer.setVisible(False)
+            self.append_child_nodes(sources_group, [source_layer])
+            self.frame_name_to_source_layer[frame_name] = source_layer
+        return source_layer
+
+    def _reset_source_layers(self, document: Document) -> Node:
+        self.remove_layer_if_exists(document, self.SOURCES_ROOT_LAYER_NAME)
+        sources_group = document.createGroupLayer(self.SOURCES_ROOT_LAYER_NAME)
+        sources_group.setVisible(False)
+        sources_group.setCollapsed(True)
+        background_layer = document.nodeByName(self.BACKGROUND_LAYER_NAME)
+        document.rootNode().addChildNode(sources_group, background_layer)
+        self.frame_name_to_source_layer = {}
+        return sources_group
+
+    def _log_source_layer_reuse(self) -> None:
+        self.log_info(f"Animation uses {len(self.frame_name_to_source_layer)} unique frame file layer(s) "
+                      f"for {self.timeline.frame_count} frame layer(s).")
+
+    def frame_name_to_filepath(self, frame_name: str, frames_directory: Optional[str] = None) -> str:
+        return os.path.join(frames_directory or self._get_frames_directory(), frame_name + ".png")
 
     def refresh_frame_index(self) -> None:
         self.log_info(f"Refreshing future frame index...")
-        self.frame_name_to_node, self.frame_name_to_destination_nodes = self.calculate_frame_destinations()
+        with self.profiler.span("build_index"):
+            leaf_nodes = self.get_leaf_nodes()
+            self.frame_graph, self.layer_id_to_frame_name = self.calculate_frame_destinations(leaf_nodes)
+            self._build_frame_search_index()
+        self.frame_layer_signature = {self.get_node_id(leaf): leaf.name() for leaf in leaf_nodes}
+        active_document = self.get_active_document()
+        self.document_key = self.get_document_key(active_document) if active_document else None
         self.log_info(f"Done refreshing future frame index.")
 
-    def calculate_frame_destinations(self) -> Tuple[Dict[str, Node], Dict[str, List[Node]]]:
-        frame_name_to_node, frame_name_to_aliases, frame_name_to_destinations = self.get_layer_information()
-
-        # What Node is being talked about when an alias is given. Since anything can claim an alias, we get a Set.
-        destination_name_to_frame_name: Dict[str, Set[str]] = defaultdict(set)
-        for frame_name, aliases in frame_name_to_aliases.items():
-            for alias in aliases:
-                destination_name_to_frame_name[alias].add(frame_name)
-
-        # Finally, assemble the data structure we can query for what frames come next.
-        frame_name_to_destination_nodes: Dict[str, List[Node]] = {}
-        for frame_name, aliases in frame_name_to_destinations.items():
-            unique_destination_frame_names: Set[str] = set()
-            for alias in aliases:
-                if alias not in destination_name_to_frame_name:
-                    self.log_warning(f"Layer not found for alias: {alias}")
-                    continue
-                unique_destination_frame_names.update(destination_name_to_frame_name[alias])
+    def calculate_frame_destinations(self, leaf_nodes: List[Node]) -> Tuple[FrameGraph, Dict[str, str]]:
+        frame_graph = FrameGraph()
+        layer_id_to_frame_name: Dict[str, str] = {}
+        for leaf in leaf_nodes:
+            frame_name = frame_graph.add_layer(leaf.name(), leaf)
+            if frame_name:
+                layer_id_to_frame_name[self.get_node_id(leaf)] = frame_name
+        frame_graph.resolve()
+        for warning in frame_graph.take_warnings():
+            self.log_warning(warning)
+        self._log_missing_aliases(frame_graph)
+        return frame_graph, layer_id_to_frame_name
+
+    def _log_missing_aliases(self, frame_graph: FrameGraph) -> None:
+        missing_aliases = frame_graph.missing_aliases()
+        if missing_aliases:
+            self.log_warning(f"Layers not found for {len(missing_aliases)} alias(es): {' '.join(missing_aliases)}")
+
+    def get_frame_routes(self) -> FrameRoutes:
+        if self.frame_routes.graph is not self.frame_graph:
+            self.frame_routes = FrameRoutes(self.frame_graph)
+        return self.frame_routes
+
+    def get_frame_search_index(self) -> FrameSearchIndex:
+        """The search index of the frame graph, built again only if layers were added or removed since."""
+        if self.frame_search_index.version != self.frame_graph.version:
+            self._build_frame_search_index()
+        return self.frame_search_index
+
+    def _build_frame_search_index(self) -> None:
+        graph = self.frame_graph
+        self.frame_search_index = FrameSearchIndex(((frame_name, graph.aliases(frame_name), graph.comments(frame_name))
+                                                    for frame_name in graph.frame_names()),
+                                                   graph.version)
+
+    def filter_choices(self) -> None:
+        with self.profiler.span("search"):
+            matching_frame_names = self.get_frame_search_index().search(self.frame_search_widget.text())
+            self.frames_filter_model.set_frame_names(matching_frame_names)
+
+    def find_path_to_target(self) -> Optional[List[str]]:
+        target_frame_name = self.target_frame_name_widget.text().strip()
+        if target_frame_name not in self.frame_graph:
+            self.log_error(f"No frames in index for: {target_frame_name}")
+            return None
+
+        start_frame_name = self.current_frame_name_widget.text()
+        path = self.get_frame_routes().shortest_path(start_frame_name, target_frame_name)
+        if path is None:
+            self.log_warning(f"{target_frame_name} can't be reached from {start_frame_name}.")
+            return None
+
+        frame_count = len(path) * self.frames_to_add_spinner.value()
+        self.log_info(f"Path to {target_frame_name} in {len(path)} pick(s), {frame_count} frame(s): {' '.join(path)}")
+        return path
+
+    def show_path_to_target(self) -> None:
+        self.find_path_to_target()
+
+    def append_path_to_target(self) -> None:
+        path = self.find_path_to_target()
+        if not path:
+            return
 
-            unique_destination_nodes = [frame_name_to_node[alias] for alias in unique_destination_frame_names]
-            frame_name_to_destination_nodes[frame_name] = unique_destination_nodes
+        duration = self.frames_to_add_spinner.value()
+        entries = [TimelineEntry(frame_name, duration) for frame_name in path]
+        self.disable_controls()
+        if self.queue_mode_checkbox.isChecked():
+            self.queue_entries(entries)
+        else:
+            self._append_animation_entries(entries)
+        self.update_current_frame_name(path[-1])
+        self.enable_controls()
 
-        return frame_name_to_node, frame_name_to_destination_nodes
+    def analyze_frame_graph(self) -> None:
+        start_frame_name = self.current_frame_name_widget.text()
+        report = self.get_frame_routes().analyze(start_frame_name)
+        self.log_info(f"{report.frame_count} frame(s) in {report.component_count} group(s) that can reach each "
+                      f"other. The largest group has {report.largest_component_size} frame(s).")
+        if report.dead_ends:
+            self.log_warning(f"{len(report.dead_ends)} frame(s) have no possible futures: {' '.join(report.dead_ends)}")
+        if report.unreferenced:
+            self.log_warning(f"{len(report.unreferenced)} frame(s) are never a possible future of another frame: "
+                             f"{' '.join(report.unreferenced)}")
+        if report.unreachable:
+            self.log_warning(f"{len(report.unreachable)} frame(s) can't be reached from {start_frame_name}: "
+                             f"{' '.join(report.unreachable)}")
+        if report.missing_aliases:
+            self.log_warning(f"Layers not found for {len(report.missing_aliases)} alias(es): "
+                             f"{' '.join(report.missing_aliases)}")
+
+    def generate_sequence(self) -> None:
+        """Write a random walk over the frames into the descriptor, then build the animation layer once."""
+        if not self.get_active_document():
+            self.log_error("Make or open a document.")
+            return
+        if not len(self.frame_graph):
+            self.log_error("No frames in index. Initialize first.")
+            return
+        if self.pending_entries:
+            # Generating continues from the end of the animation, so queued picks would be silently skipped over.
+            self.log_error(f"{len(self.pending_entries)} pick(s) are queued. Commit or clear the queue before "
+                           f"generating.")
+            return
 
-    def get_layer_information(self) -> Tuple[Dict[str, Node], Dict[str, List[str]], Dict[str, List[str]]]:
-        leaf_nodes = self.get_leaf_nodes()
+        replace = self.generate_replace_checkbox.isChecked()
+        start_frame_name = None if replace or not self.timeline else self.timeline.last().frame_name
+        end_frame_name = self.generated_end_frame_name_widget.text().strip() or None
+        length = self.generated_length_spinner.value()
+        generator = SequenceGenerator(self.get_frame_routes(), self.frames_to_add_spinner.value())
+        with self.profiler.span("generate_sequence"):
+            try:
+                entries = generator.generate(start_frame_name, length, end_frame_name)
+            except ValueError as e:
+                self.log_error(str(e))
+                return
+        if not entries:
+            self.log_warning(f"{start_frame_name} has no possible futures. Nothing generated.")
+            return
 
-        frame_name_to_node: Dict[str, Node] = {}
-        frame_name_to_aliases: Dict[str, List[str]] = {}
-        frame_name_to_destinations: Dict[str, List[str]] = {}
-        for leaf in leaf_nodes:
-            match = self.extract_strings_from_node(leaf)
-            if not match:
-                self.log_warning(f"Skipping incorrectly named layer: {leaf.name()}")
-                continue
-
-            frame_name = match.group('name')
-            frame_aliases = match.group('aliases')
-            frame_destinations = match.group('destinations')
-            if self.INVALID_FILENAME_CHARACTERS_PATTERN.search(frame_name):
-                self.log_warning(f"Skipping layer (invalid character): {frame_name}")
-                self.log_warning(f'Invalid character list: {" ".join(self.INVALID_FILENAME_CHARACTERS)}')
-                continue
-
-            if frame_name in frame_name_to_node:
-                self.log_warning(f"Skipping layer (duplicate name): {frame_name}")
-                continue
-            frame_name_to_node[frame_name] = leaf
-            frame_name_to_aliases[frame_name] = frame_aliases.split(" ") if frame_aliases else []
-            frame_name_to_aliases[frame_name].extend([frame_name])  # A layer name is an alias to itself.
-            frame_name_to_destinations[frame_name] = frame_destinations.split(" ") if frame_destinations else []
-
-        return frame_name_to_node, frame_name_to_aliases, frame_name_to_destinations
-
-    def extract_strings_from_node(self, node: Node) -> Optional[Match]:
-        name_with_removed_comments = self.COMMENT_PATTERN.sub("", node.name())
-        name_with_spaces_squished = re.sub(r"\s\s+", " ", name_with_removed_comments.strip())
-        match = self.LAYER_NAME_PATTERN.fullmatch(name_with_spaces_squished)
-        return match
+        generated_length = sum(entry.duration for entry in entries)
+        self.log_info(f"Generated {generated_length} frame(s) from {len(entries)} pick(s).")
+        if generated_length < length and not end_frame_name:
+            self.log_warning(f"Stopped early at {entries[-1].frame_name}, which has no possible futures.")
+
+        self.disable_controls()
+        if replace:
+            self.timeline = Timeline(entries)
+        else:
+            self.timeline.extend(entries)
+        self._save_descriptor()
+        self.update_current_frame_name(entries[-1].frame_name)
+        self.job_scheduler.start(self._regenerate_animation_layer_job(), self._generate_sequence_finished)
+
+    def _generate_sequence_finished(self, cancelled: bool) -> None:
+        if cancelled:
+            self.log_warning("Generating cancelled. The descriptor has the whole sequence, so Initialize / Reload "
+                             "will finish the Animation layer.")
+        self.progress_bar.reset()
+        self.progress_bar.setFormat("%p%")
+        self.enable_controls()
+
+    def update_frame_index_if_layers_changed(self) -> None:
+        """Patch the frame index with only the leaves that were added, removed or renamed since it was built."""
+        active_document = self.get_active_document()
+        if not self.frame_layer_signature or not self.button_reload.isEnabled():
+            return
+        if not active_document or self.get_document_key(active_document) != self.document_key:
+            return
+        frames_group = active_document.nodeByName(self.FRAMES_ROOT_LAYER_NAME)
+        if not frames_group:
+            return
+
+        leaf_id_to_node = {self.get_node_id(leaf): leaf for leaf in self.recursively_get_leaf_nodes(frames_group)}
+        signature = {layer_id: leaf.name() for layer_id, leaf in leaf_id_to_node.items()}
+        if signature == self.frame_layer_signature:
+            return
+
+        removed_ids = self.frame_layer_signature.keys() - signature.keys()
+        added_ids = signature.keys() - self.frame_layer_signature.keys()
+        renamed_ids = {layer_id for layer_id in signature.keys() & self.frame_layer_signature.keys()
+                       if signature[layer_id] != self.frame_layer_signature[layer_id]}
+
+        freed_frame_names = set()
+        for layer_id in removed_ids | renamed_ids:
+            frame_name = self.layer_id_to_frame_name.pop(layer_id, None)
+            if frame_name:
+                self.frame_graph.remove_frame(frame_name)
+                freed_frame_names.add(frame_name)
+        # A layer skipped for having the same name as another can take that name once the other layer lets it go.
+        retried_ids = set()
+        if freed_frame_names:
+            for layer_id in signature.keys() & self.frame_layer_signature.keys() - renamed_ids:
+                if layer_id in self.layer_id_to_frame_name:
+                    continue
+                parsed = parse_layer_name(signature[layer_id])
+                if parsed and parsed.frame_name in freed_frame_names:
+                    retried_ids.add(layer_id)
+        new_frame_names = []
+        # Layers are added in the order they're in the "Frames" group, so the same layer wins a name as on reload.
+        layer_ids_to_add = added_ids | renamed_ids | retried_ids
+        for layer_id in (layer_id for layer_id in leaf_id_to_node if layer_id in layer_ids_to_add):
+            frame_name = self.frame_graph.add_layer(signature[layer_id], leaf_id_to_node[layer_id])
+            if frame_name:
+                self.layer_id_to_frame_name[layer_id] = frame_name
+                new_frame_names.append(frame_name)
+        self.frame_graph.resolve()
+        self.frame_layer_signature = signature
+        self.filter_choices()
+
+        self.disable_controls()
+        for warning in self.frame_graph.take_warnings():
+            self.log_warning(warning)
+        self.log_info(f"Frame layers changed: {len(added_ids)} added, {len(removed_ids)} removed, "
+                      f"{len(renamed_ids)} renamed. Updated the frame index.")
+        if retried_ids:
+            self.log_info(f"Added {len(retried_ids)} layer(s) that were skipped for a name that is now free.")
+        if new_frame_names and os.path.exists(self._get_frames_directory()):
+            self._export_new_frames(new_frame_names)
+        self.refresh_choices()
+        self.enable_controls()
+
+    @staticmethod
+    def get_node_id(node: Node) -> str:
+        return node.uniqueId().toString()
 
     def get_leaf_nodes(self) -> List[Node]:
         doc = self.get_active_document()
@@ -458,38 +1514,186 @@ class ChooseYourOwnAnimation(DockWidget):
 
         frame_name = self.current_frame_name_widget.text()
         if not frame_name:
-            destination_nodes = self.frame_name_to_node.values()
-        elif frame_name not in self.frame_name_to_destination_nodes:
+            destination_frames = list(self.frame_graph.frames())
+        elif frame_name not in self.frame_graph:
             self.log_error(f"No frames in index for: {frame_name}")
             return
         else:
-            destination_nodes = self.frame_name_to_destination_nodes[frame_name]
+            destination_frames = self.frame_graph.destination_frames(frame_name)
 
-        self.frames_model.clear()
+        # Thumbnails are rendered later, and only for the rows the view actually shows.
         # sorted(destination_nodes, key=attrgetter('name'))
-        for dn in destination_nodes:
-            destination_frame_icon = QIcon(QPixmap.fromImage(dn.thumbnail(128, 128)))
-            destination_frame_name = self.extract_strings_from_node(dn).group('name')
-            item = QStandardItem(destination_frame_icon, destination_frame_name)
-            item.setData(dn, self.NODE_DATA)
-            self.frames_model.appendRow(item)
-
+        self.frames_model.set_frames(destination_frames)
         self.log_info("Finished refreshing future frame choices.")
 
+    def _log_thumbnail_cache_counts(self, rendered_count: int) -> None:
+        if not self.thumbnail_cache or not rendered_count:
+            return
+        cache = self.thumbnail_cache
+        self.log_info(f"Thumbnails: {cache.memory_hits} from memory, {cache.disk_hits} from disk, "
+                      f"{cache.misses} rendered.")
+        cache.reset_counts()
+
+    def get_frame_thumbnail(self, frame_name: str, node: Node) -> QImage:
+        fingerprint = self.frame_name_to_fingerprint.get(frame_name)
+        if not self.thumbnail_cache or not fingerprint:
+            return self.render_thumbnail(node)
+        return self.thumbnail_cache.get(frame_name, fingerprint, lambda: self.render_thumbnail(node))
+
+    def render_thumbnail(self, node: Node) -> QImage:
+        with self.profiler.span("render_thumbnail"):
+            return node.thumbnail(self.THUMBNAIL_SIZE, self.THUMBNAIL_SIZE)
+
     def choice_double_clicked(self, clicked_index) -> None:
         active_document = self.get_active_document()
         if not active_document:
             self.log_error("Make or open the document.")
 
-        node_of_clicked_choice = clicked_index.data(self.NODE_DATA)
-        frame_name = self.extract_strings_from_node(node_of_clicked_choice).group('name')
+        frame_name = clicked_index.data(Qt.DisplayRole)
         duration = self.frames_to_add_spinner.value()
 
         self.disable_controls()
-        self._append_animation_frames(frame_name, duration)
+        if self.queue_mode_checkbox.isChecked():
+            self.queue_entries([TimelineEntry(frame_name, duration)])
+        else:
+            self._append_animation_frames(frame_name, duration)
         self.update_current_frame_name(frame_name)
         self.enable_controls()
 
+    def undo_last_pick(self) -> None:
+        if not self.timeline:
+            self.log_warning("The animation is empty. Nothing to undo.")
+            return
+        self._edit_timeline_entry(self.JOURNAL_OPERATION_DELETE, len(self.timeline) - 1)
+
+    def delete_pick(self) -> None:
+        self._edit_timeline_entry(self.JOURNAL_OPERATION_DELETE, self.edit_pick_spinner.value() - 1)
+
+    def insert_pick(self) -> None:
+        frame_name = self.edit_frame_name_widget.text().strip()
+        if frame_name not in self.frame_graph:
+            self.log_error(f"No frames in index for: {frame_name}")
+            return
+        self._edit_timeline_entry(self.JOURNAL_OPERATION_INSERT, self.edit_pick_spinner.value() - 1,
+                                  TimelineEntry(frame_name, self.frames_to_add_spinner.value()))
+
+    def retime_pick(self) -> None:
+        self._edit_timeline_entry(self.JOURNAL_OPERATION_RETIME, self.edit_pick_spinner.value() - 1,
+                                  duration=self.frames_to_add_spinner.value())
+
+    def _edit_timeline_entry(self, operation: str, index: int, entry: Optional[TimelineEntry] = None,
+                             duration: Optional[int] = None) -> None:
+        """Apply one edit to the descriptor, then rebuild the animation from the first frame it changed."""
+        if not self.get_active_document():
+            self.log_error("Make or open a document.")
+            return
+        last_index = len(self.timeline) if operation == self.JOURNAL_OPERATION_INSERT else len(self.timeline) - 1
+        if index > last_index:
+            self.log_error(f"The animation only has {len(self.timeline)} pick(s).")
+            return
+
+        fields: Dict = {self.KEY_JOURNAL_RECORD_INDEX: index}
+        if entry:
+            fields.update(self.timeline_entry_to_descriptor_frame(entry))
+        if duration is not None:
+            fields[self.KEY_FRAMES_LIST_FRAME_DURATION] = duration
+
+        first_changed_time = self.timeline.start_time(index) if index < len(self.timeline) else \
+            self.timeline.frame_count
+        if operation == self.JOURNAL_OPERATION_RETIME:
+            # The frames the entry keeps showing don't move.
+            first_changed_time += min(self.timeline[index].duration, duration)
+        edited_entry = self.timeline[index] if index < len(self.timeline) else None
+
+        self.disable_controls()
+        self._edit_descriptor(operation, fields)
+        if operation == self.JOURNAL_OPERATION_DELETE:
+            self.log_info(f"Deleting pick {index + 1}: {edited_entry.frame_name} \u00d7{edited_entry.duration}")
+        elif operation == self.JOURNAL_OPERATION_INSERT:
+            self.log_info(f"Inserting pick {index + 1}: {entry.frame_name} \u00d7{entry.duration}")
+        else:
+            self.log_info(f"Showing pick {index + 1} ({edited_entry.frame_name}) for {duration} frame(s) "
+                          f"instead of {edited_entry.duration}")
+        self._rebuild_animation_from_time(first_changed_time)
+        if not self.pending_entries:
+            self.update_current_frame_name(self.timeline.last().frame_name if self.timeline else "")
+        self.enable_controls()
+
+    def queue_entries(self, entries: List[TimelineEntry]) -> None:
+        """Hold entries back until the queue is committed. Choices continue from the last queued frame."""
+        for entry in entries:
+            self.pending_entries.append(entry)
+            self.pending_list.addItem(f"{entry.frame_name} \u00d7{entry.duration}")
+        self.pending_list.scrollToBottom()
+        self._update_preview_sequence()
+
+    def commit_pending_entries(self) -> None:
+        if not self.pending_entries:
+            return
+        if not self.get_active_document():
+            self.log_error("Make or open a document.")
+            return
+
+        self.disable_controls()
+        self._append_animation_entries(self.pending_entries)
+        self.pending_entries = []
+        self.pending_list.clear()
+        self._update_preview_sequence()
+        self.enable_controls()
+
+    def clear_pending_entries(self) -> None:
+        self.pending_entries = []
+        self.pending_list.clear()
+        self.update_current_frame_name(self.timeline.last().frame_name if self.timeline else "")
+        self._update_preview_sequence()
+
+    def play_preview(self) -> None:
+        self._play_preview(0)
+
+    def play_preview_ending(self) -> None:
+        active_document = self.get_active_document()
+        frames_per_second = active_document.framesPerSecond() if active_document else 24
+        self._play_preview(self.timeline.frame_count - self.PREVIEW_ENDING_SECONDS * frames_per_second)
+
+    def _play_preview(self, start_time: int) -> None:
+        active_document = self.get_active_document()
+        if not active_document:
+            self.log_error("Make or open a document.")
+            return
+        continuation = self._get_preview_continuation()
+        if not self.timeline and not continuation:
+            self.log_warning("Nothing to preview. Pick, queue or hover over some frames first.")
+            return
+        self.preview_player.play(self.timeline, continuation, active_document.framesPerSecond(), start_time)
+
+    def stop_preview(self) -> None:
+        if not self.preview_player.is_playing():
+            return
+        self.preview_player.stop()
+        cache = self.preview_image_cache
+        self.log_info(f"Preview stopped. {self.preview_player.late_count} frame(s) were late, {len(cache)} "
+                      f"image(s) use {cache.total_bytes / 1e6:.1f} MB.")
+        if cache.missing_count:
+            self.log_warning(f"{cache.missing_count} frame file(s) couldn't be read. Reload to export them.")
+
+    def _get_preview_continuation(self) -> List[TimelineEntry]:
+        continuation = list(self.pending_entries)
+        if self.preview_hovered_entry:
+            continuation.append(self.preview_hovered_entry)
+        return continuation
+
+    def _update_preview_sequence(self) -> None:
+        if self.preview_player.is_playing():
+            self.preview_player.set_sequence(self.timeline, self._get_preview_continuation())
+
+    def preview_hovered_choice(self, index) -> None:
+        self.preview_hovered_entry = TimelineEntry(index.data(Qt.DisplayRole), self.frames_to_add_spinner.value())
+        self._update_preview_sequence()
+
+    def clear_preview_hovered_choice(self) -> None:
+        self.preview_hovered_entry = None
+        self._update_preview_sequence()
+
     @staticmethod
     def do_krita_action(action_name: str) -> None:
         Krita.instance().action(action_name).trigger()
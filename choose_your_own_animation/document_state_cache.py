@@ -0,0 +1,51 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class DocumentStateCache:
+    """
+    The docker's state for the documents that aren't active, so that switching back to one needs no reload.
+
+    A state is whatever the caller captures, along with an estimate of how much memory it holds on to. States are kept
+    in least recently used order, and the oldest are dropped once the estimates add up to more than the budget.
+    """
+
+    def __init__(self, memory_budget_bytes: int):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._states: "OrderedDict[Hashable, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._states
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def put(self, key: Hashable, state: Dict[str, Any], size_bytes: int) -> List[Hashable]:
+        """Store a state, returning the keys of the states dropped to stay in budget, which may include this one."""
+        self.discard(key)
+        self._states[key] = (state, size_bytes)
+        self._total_bytes += size_bytes
+
+        evicted_keys = []
+        while self._states and self._total_bytes > self.memory_budget_bytes:
+            evicted_key, (_, evicted_size_bytes) = self._states.popitem(last=False)
+            self._total_bytes -= evicted_size_bytes
+            evicted_keys.append(evicted_key)
+        return evicted_keys
+
+    def take(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """Remove and return a state, since it belongs to the docker again while its document is active."""
+        entry = self._states.pop(key, None)
+        if entry is None:
+            return None
+        state, size_bytes = entry
+        self._total_bytes -= size_bytes
+        return state
+
+    def discard(self, key: Hashable) -> None:
+        self.take(key)
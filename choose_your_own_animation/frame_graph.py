@@ -0,0 +1,280 @@
+import re
+from array import array
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+INVALID_FILENAME_CHARACTERS = r'<>:"/\|?*'
+INVALID_FILENAME_CHARACTERS_PATTERN = re.compile(f"[{re.escape(INVALID_FILENAME_CHARACTERS)}]")
+COMMENT_PATTERN = re.compile(r"\[(.*?)]")
+LAYER_NAME_PATTERN = re.compile(r"(?P<name>\S+)\s*(?:\((?P<aliases>[^()]+)\))?\s*"
+                                r"(?:\{(?P<min_duration>\d+)(?:-(?P<max_duration>\d+))?})? - (?P<destinations>.+)")
+WEIGHTED_DESTINATION_PATTERN = re.compile(r"(?P<alias>[^*]+)\*(?P<weight>\d+(?:\.\d*)?|\.\d+)")
+DEFAULT_DESTINATION_WEIGHT = 1.0
+
+
+class ParsedLayerName(NamedTuple):
+    frame_name: str
+    aliases: List[str]
+    destinations: List[str]
+    comments: List[str]
+    # How likely each destination is to be picked when generating a sequence, relative to the others.
+    destination_weights: List[float]
+    # The smallest and largest number of timeline frames to show this frame for when generating a sequence.
+    duration_range: Optional[Tuple[int, int]]
+
+
+def parse_layer_name(layer_name: str) -> Optional[ParsedLayerName]:
+    """
+    Split a layer name like `Long_Name (Aliases) {2-4} [Comment] - Future*3 OtherFuture` into its parts.
+    The duration range in braces and the weights after a `*` are optional.
+    """
+    comments = [comment.strip() for comment in COMMENT_PATTERN.findall(layer_name)]
+    name_with_removed_comments = COMMENT_PATTERN.sub("", layer_name)
+    name_with_spaces_squished = re.sub(r"\s\s+", " ", name_with_removed_comments.strip())
+    match = LAYER_NAME_PATTERN.fullmatch(name_with_spaces_squished)
+    if not match:
+        return None
+
+    aliases = match.group('aliases')
+    destinations = []
+    destination_weights = []
+    for destination in match.group('destinations').split(" "):
+        weighted_match = WEIGHTED_DESTINATION_PATTERN.fullmatch(destination)
+        if weighted_match:
+            destinations.append(weighted_match.group('alias'))
+            destination_weights.append(float(weighted_match.group('weight')))
+        else:
+            destinations.append(destination)
+            destination_weights.append(DEFAULT_DESTINATION_WEIGHT)
+
+    duration_range = None
+    if match.group('min_duration'):
+        min_duration = int(match.group('min_duration'))
+        max_duration = int(match.group('max_duration') or min_duration)
+        duration_range = (max(1, min(min_duration, max_duration)), max(1, min_duration, max_duration))
+
+    return ParsedLayerName(match.group('name'),
+                           aliases.split(" ") if aliases else [],
+                           destinations,
+                           comments,
+                           destination_weights,
+                           duration_range)
+
+
+class FrameGraph:
+    """
+    Which frames can follow which, built from (layer name, handle) pairs without needing Krita.
+
+    Frame names and aliases are interned to integer ids, and every frame's resolved destinations are stored as an
+    array of frame ids. Layers can be added and removed one at a time; only the frames whose destinations could have
+    changed are resolved again. The handle is whatever the caller wants back for a frame, like a Krita Node.
+    """
+
+    def __init__(self):
+        self._names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+
+        self._frame_handles: Dict[int, Any] = {}
+        self._frame_layer_names: Dict[int, str] = {}
+        self._frame_aliases: Dict[int, array] = {}
+        self._frame_destination_aliases: Dict[int, array] = {}
+        self._frame_destination_alias_weights: Dict[int, array] = {}
+        self._frame_duration_ranges: Dict[int, Tuple[int, int]] = {}
+        self._frame_comments: Dict[int, List[str]] = {}
+
+        # Since anything can claim an alias, an alias can stand for several frames.
+        self._alias_frames: Dict[int, Set[int]] = defaultdict(set)
+        # The frames that list an alias as a destination, so we know who to resolve again when the alias changes.
+        self._alias_referrers: Dict[int, Set[int]] = defaultdict(set)
+
+        self._destinations: Dict[int, array] = {}
+        self._destination_weights: Dict[int, array] = {}
+        self._frame_missing_aliases: Dict[int, List[int]] = {}
+        self._unresolved_frames: Set[int] = set()
+        self.warnings: List[str] = []
+        self.version = 0
+
+    @classmethod
+    def build(cls, layers: Iterable[Tuple[str, Any]]) -> "FrameGraph":
+        graph = cls()
+        for layer_name, handle in layers:
+            graph.add_layer(layer_name, handle)
+        graph.resolve()
+        return graph
+
+    def __len__(self) -> int:
+        return len(self._frame_handles)
+
+    def __contains__(self, frame_name: str) -> bool:
+        return self._name_ids.get(frame_name) in self._frame_handles
+
+    def intern(self, name: str) -> int:
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = len(self._names)
+            self._names.append(name)
+            self._name_ids[name] = name_id
+        return name_id
+
+    def name(self, name_id: int) -> str:
+        return self._names[name_id]
+
+    def frame_id(self, frame_name: str) -> Optional[int]:
+        frame_id = self._name_ids.get(frame_name)
+        return frame_id if frame_id in self._frame_handles else None
+
+    def frame_ids(self) -> Iterable[int]:
+        return self._frame_handles.keys()
+
+    def frames(self) -> Iterator[Tuple[str, Any]]:
+        """Every frame name with its handle, in the order the layers were added."""
+        for frame_id, handle in self._frame_handles.items():
+            yield self._names[frame_id], handle
+
+    def frame_names(self) -> List[str]:
+        return [self._names[frame_id] for frame_id in self._frame_handles]
+
+    def handle(self, frame_name: str) -> Any:
+        return self._frame_handles[self._name_ids[frame_name]]
+
+    def layer_name(self, frame_name: str) -> str:
+        return self._frame_layer_names[self._name_ids[frame_name]]
+
+    def aliases(self, frame_name: str) -> List[str]:
+        return [self._names[alias_id] for alias_id in self._frame_aliases[self._name_ids[frame_name]]]
+
+    def comments(self, frame_name: str) -> List[str]:
+        return self._frame_comments[self._name_ids[frame_name]]
+
+    def destination_ids(self, frame_id: int) -> array:
+        self.resolve()
+        return self._destinations[frame_id]
+
+    def destination_weights(self, frame_id: int) -> array:
+        """The weight of each destination in `destination_ids`, in the same order."""
+        self.resolve()
+        return self._destination_weights[frame_id]
+
+    def duration_range(self, frame_id: int) -> Optional[Tuple[int, int]]:
+        return self._frame_duration_ranges.get(frame_id)
+
+    def destination_names(self, frame_name: str) -> List[str]:
+        return [self._names[frame_id] for frame_id in self.destination_ids(self._name_ids[frame_name])]
+
+    def destinations(self, frame_name: str) -> List[Any]:
+        return [self._frame_handles[frame_id] for frame_id in self.destination_ids(self._name_ids[frame_name])]
+
+    def destination_frames(self, frame_name: str) -> List[Tuple[str, Any]]:
+        return [(self._names[frame_id], self._frame_handles[frame_id])
+                for frame_id in self.destination_ids(self._name_ids[frame_name])]
+
+    def add_layer(self, layer_name: str, handle: Any) -> Optional[str]:
+        """Add a layer, returning its frame name, or None if it was skipped with a warning."""
+        parsed = parse_layer_name(layer_name)
+        if not parsed:
+            self.warnings.append(f"Skipping incorrectly named layer: {layer_name}")
+            return None
+        return self.add_parsed_layer(layer_name, parsed, handle)
+
+    def add_parsed_layer(self, layer_name: str, parsed: ParsedLayerName, handle: Any) -> Optional[str]:
+        frame_name = parsed.frame_name
+        if INVALID_FILENAME_CHARACTERS_PATTERN.search(frame_name):
+            self.warnings.append(f"Skipping layer (invalid character): {frame_name}")
+            self.warnings.append(f'Invalid character list: {" ".join(INVALID_FILENAME_CHARACTERS)}')
+            return None
+
+        frame_id = self.intern(frame_name)
+        if frame_id in self._frame_handles:
+            self.warnings.append(f"Skipping layer (duplicate name): {frame_name}")
+            return None
+
+        self._frame_handles[frame_id] = handle
+        self._frame_layer_names[frame_id] = layer_name
+        self._frame_comments[frame_id] = parsed.comments
+
+        # A layer name is an alias to itself.
+        alias_ids = array('i', dict.fromkeys(self.intern(alias) for alias in parsed.aliases + [frame_name]))
+        self._frame_aliases[frame_id] = alias_ids
+        for alias_id in alias_ids:
+            self._alias_frames[alias_id].add(frame_id)
+            self._unresolved_frames.update(self._alias_referrers.get(alias_id, ()))
+
+        destination_alias_ids = array('i', (self.intern(alias) for alias in parsed.destinations))
+        self._frame_destination_aliases[frame_id] = destination_alias_ids
+        self._frame_destination_alias_weights[frame_id] = array('d', parsed.destination_weights)
+        if parsed.duration_range:
+            self._frame_duration_ranges[frame_id] = parsed.duration_range
+        for alias_id in destination_alias_ids:
+            self._alias_referrers[alias_id].add(frame_id)
+
+        self._unresolved_frames.add(frame_id)
+        self.version += 1
+        return frame_name
+
+    def remove_frame(self, frame_name: str) -> Any:
+        """Remove a frame, returning its handle."""
+        frame_id = self._name_ids[frame_name]
+        handle = self._frame_handles.pop(frame_id)
+        del self._frame_layer_names[frame_id]
+        del self._frame_comments[frame_id]
+        self._destinations.pop(frame_id, None)
+        self._destination_weights.pop(frame_id, None)
+        self._frame_duration_ranges.pop(frame_id, None)
+        self._frame_destination_alias_weights.pop(frame_id, None)
+        self._frame_missing_aliases.pop(frame_id, None)
+        self._unresolved_frames.discard(frame_id)
+
+        for alias_id in self._frame_aliases.pop(frame_id):
+            self._alias_frames[alias_id].discard(frame_id)
+            if not self._alias_frames[alias_id]:
+                del self._alias_frames[alias_id]
+            self._unresolved_frames.update(self._alias_referrers.get(alias_id, ()))
+
+        for alias_id in self._frame_destination_aliases.pop(frame_id):
+            referrers = self._alias_referrers.get(alias_id)
+            if referrers is not None:
+                referrers.discard(frame_id)
+                if not referrers:
+                    del self._alias_referrers[alias_id]
+
+        self.version += 1
+        return handle
+
+    def resolve(self) -> None:
+        """Turn the destination aliases of every frame added or affected since the last call into frame ids."""
+        if not self._unresolved_frames:
+            return
+
+        for frame_id in self._unresolved_frames:
+            if frame_id not in self._frame_handles:
+                continue
+            # A frame named by several destination aliases gets the sum of their weights.
+            destination_weights: Dict[int, float] = defaultdict(float)
+            missing_alias_ids = []
+            alias_weights = self._frame_destination_alias_weights[frame_id]
+            for alias_id, alias_weight in zip(self._frame_destination_aliases[frame_id], alias_weights):
+                alias_frame_ids = self._alias_frames.get(alias_id)
+                if not alias_frame_ids:
+                    missing_alias_ids.append(alias_id)
+                    continue
+                for destination_id in alias_frame_ids:
+                    destination_weights[destination_id] += alias_weight
+            destination_ids = sorted(destination_weights)
+            self._destinations[frame_id] = array('i', destination_ids)
+            self._destination_weights[frame_id] = array('d', (destination_weights[d] for d in destination_ids))
+            if missing_alias_ids:
+                self._frame_missing_aliases[frame_id] = missing_alias_ids
+            else:
+                self._frame_missing_aliases.pop(frame_id, None)
+        self._unresolved_frames.clear()
+
+    def missing_aliases(self) -> List[str]:
+        """Every destination alias that no layer claims, so that they can be reported all at once."""
+        self.resolve()
+        missing_alias_ids = {alias_id for alias_ids in self._frame_missing_aliases.values() for alias_id in alias_ids}
+        return sorted(self._names[alias_id] for alias_id in missing_alias_ids)
+
+    def take_warnings(self) -> List[str]:
+        warnings = self.warnings
+        self.warnings = []
+        return warnings
@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from typing import AbstractSet, Any, Callable, List, Optional, Tuple
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QSortFilterProxyModel, Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import QIcon, QImage, QPixmap
+
+
+class FrameListModel(QAbstractListModel):
+    """
+    Frame choices for the docker, whose thumbnails are only rendered once a view asks to show them.
+
+    Names are available immediately. A thumbnail is requested the first time a view asks for a row's icon, which only
+    happens for rows near the viewport, and pending requests are rendered a few at a time from the event loop so the
+    view stays responsive. Rows are updated as their thumbnails arrive.
+    """
+    THUMBNAIL_BATCH_SIZE = 8
+    MAX_CACHED_ICONS = 512
+
+    # Emitted with the number of thumbnails rendered once no more are pending.
+    thumbnails_rendered = pyqtSignal(int)
+
+    def __init__(self, node_role: int, icon_size: int, thumbnail_provider: Callable[[str, Any], QImage], parent=None):
+        super().__init__(parent)
+        self.node_role = node_role
+        self.icon_size = icon_size
+        self.thumbnail_provider = thumbnail_provider
+
+        self._frames: List[Tuple[str, Any]] = []
+        self._icons: "OrderedDict[int, QIcon]" = OrderedDict()
+        self._pending_rows: "OrderedDict[int, None]" = OrderedDict()
+        self._rendered_count = 0
+
+        placeholder_pixmap = QPixmap(icon_size, icon_size)
+        placeholder_pixmap.fill(Qt.transparent)
+        self._placeholder_icon = QIcon(placeholder_pixmap)
+
+        self._render_timer = QTimer(self)
+        self._render_timer.setSingleShot(True)
+        self._render_timer.setInterval(0)
+        self._render_timer.timeout.connect(self._render_pending_thumbnails)
+
+    def set_frames(self, frames: List[Tuple[str, Any]]) -> None:
+        self.beginResetModel()
+        self._frames = list(frames)
+        self._icons.clear()
+        self._pending_rows.clear()
+        self._rendered_count = 0
+        self.endResetModel()
+
+    def memory_bytes(self) -> int:
+        """About how much memory the rendered icons take up."""
+        return len(self._icons) * self.icon_size * self.icon_size * 4
+
+    def frame_name(self, row: int) -> str:
+        return self._frames[row][0]
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._frames)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if not index.isValid() or index.row() >= len(self._frames):
+            return None
+
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return self._frames[row][0]
+        if role == Qt.DecorationRole:
+            icon = self._icons.get(row)
+            if icon is None:
+                self._request_thumbnail(row)
+                return self._placeholder_icon
+            self._icons.move_to_end(row)
+            return icon
+        if role == self.node_role:
+            return self._frames[row][1]
+        return None
+
+    def _request_thumbnail(self, row: int) -> None:
+        self._pending_rows[row] = None
+        self._pending_rows.move_to_end(row)
+        if not self._render_timer.isActive():
+            self._render_timer.start()
+
+    def _render_pending_thumbnails(self) -> None:
+        # The most recently requested rows are the ones the view is showing right now, so they go first.
+        for _ in range(min(self.THUMBNAIL_BATCH_SIZE, len(self._pending_rows))):
+            row, _ = self._pending_rows.popitem(last=True)
+            frame_name, node = self._frames[row]
+            self._icons[row] = QIcon(QPixmap.fromImage(self.thumbnail_provider(frame_name, node)))
+            if len(self._icons) > self.MAX_CACHED_ICONS:
+                self._icons.popitem(last=False)
+            self._rendered_count += 1
+            changed_index = self.index(row)
+            self.dataChanged.emit(changed_index, changed_index, [Qt.DecorationRole])
+
+        if self._pending_rows:
+            self._render_timer.start()
+        else:
+            self.thumbnails_rendered.emit(self._rendered_count)
+            self._rendered_count = 0
+
+
+class FrameFilterProxyModel(QSortFilterProxyModel):
+    """
+    Shows only the frames of a FrameListModel whose names are in a set, such as the results of a search.
+
+    The source model is left alone, so narrowing or widening the filter keeps every thumbnail already rendered.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._frame_names: Optional[AbstractSet[str]] = None
+
+    def set_frame_names(self, frame_names: Optional[AbstractSet[str]]) -> None:
+        """Show only these frames, or every frame if None."""
+        self._frame_names = frame_names
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        if self._frame_names is None:
+            return True
+        return self.sourceModel().frame_name(source_row) in self._frame_names
@@ -0,0 +1,172 @@
+from collections import OrderedDict, deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .frame_graph import FrameGraph
+
+
+class GraphReport(NamedTuple):
+    frame_count: int
+    component_count: int
+    largest_component_size: int
+    # Frames with no possible futures, which end the animation.
+    dead_ends: List[str]
+    # Frames that no other frame lists as a possible future, so they can only start an animation.
+    unreferenced: List[str]
+    # Frames that can never be reached from the starting frame, if one was given.
+    unreachable: List[str]
+    missing_aliases: List[str]
+
+
+class FrameRoutes:
+    """
+    Answers "how do I get from this frame to that one" over a FrameGraph.
+
+    Breadth-first searches are run backwards from a target, giving the distance and next hop towards it from every
+    frame, and are cached per target. Everything is thrown away when the graph changes.
+    """
+    MAX_CACHED_TARGETS = 256
+
+    def __init__(self, graph: FrameGraph):
+        self.graph = graph
+        self._version = -1
+        self._reverse_adjacency: Dict[int, List[int]] = {}
+        self._routes_to_target: "OrderedDict[int, Tuple[Dict[int, int], Dict[int, int]]]" = OrderedDict()
+        self._components: Optional[List[List[int]]] = None
+
+    def _invalidate_if_graph_changed(self) -> None:
+        if self._version == self.graph.version:
+            return
+        self._version = self.graph.version
+        self._routes_to_target.clear()
+        self._components = None
+        self._reverse_adjacency = {frame_id: [] for frame_id in self.graph.frame_ids()}
+        for frame_id in self.graph.frame_ids():
+            for destination_id in self.graph.destination_ids(frame_id):
+                self._reverse_adjacency[destination_id].append(frame_id)
+
+    def routes_to(self, target_id: int) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """The number of steps to the target from every frame that can reach it, and the next frame to go to."""
+        self._invalidate_if_graph_changed()
+        routes = self._routes_to_target.get(target_id)
+        if routes is not None:
+            self._routes_to_target.move_to_end(target_id)
+            return routes
+
+        distances = {target_id: 0}
+        next_hops: Dict[int, int] = {}
+        queue = deque([target_id])
+        while queue:
+            frame_id = queue.popleft()
+            for previous_id in self._reverse_adjacency.get(frame_id, ()):
+                if previous_id not in distances:
+                    distances[previous_id] = distances[frame_id] + 1
+                    next_hops[previous_id] = frame_id
+                    queue.append(previous_id)
+
+        routes = (distances, next_hops)
+        self._routes_to_target[target_id] = routes
+        if len(self._routes_to_target) > self.MAX_CACHED_TARGETS:
+            self._routes_to_target.popitem(last=False)
+        return routes
+
+    def shortest_path(self, source_name: Optional[str], target_name: str) -> Optional[List[str]]:
+        """
+        The fewest frames to append after the source to end on the target, including the target itself.
+        Without a source, any frame can start the animation, so the path is just the target.
+        Returns None when the target can't be reached.
+        """
+        target_id = self.graph.frame_id(target_name)
+        if target_id is None:
+            return None
+        if not source_name:
+            return [target_name]
+        source_id = self.graph.frame_id(source_name)
+        if source_id is None:
+            return None
+
+        # Look one step ahead of the source, so that a path from a frame back to itself has at least one step.
+        distances, next_hops = self.routes_to(target_id)
+        reachable_destinations = [d for d in self.graph.destination_ids(source_id) if d in distances]
+        if not reachable_destinations:
+            return None
+        frame_id = min(reachable_destinations, key=distances.__getitem__)
+        path = [frame_id]
+        while frame_id != target_id:
+            frame_id = next_hops[frame_id]
+            path.append(frame_id)
+        return [self.graph.name(frame_id) for frame_id in path]
+
+    def strongly_connected_components(self) -> List[List[int]]:
+        """Groups of frames that can all reach each other, using an iterative version of Tarjan's algorithm."""
+        self._invalidate_if_graph_changed()
+        if self._components is not None:
+            return self._components
+
+        index_of: Dict[int, int] = {}
+        low_link: Dict[int, int] = {}
+        stack: List[int] = []
+        on_stack = set()
+        components: List[List[int]] = []
+        for root_id in self.graph.frame_ids():
+            if root_id in index_of:
+                continue
+            index_of[root_id] = low_link[root_id] = len(index_of)
+            stack.append(root_id)
+            on_stack.add(root_id)
+            work = [(root_id, iter(self.graph.destination_ids(root_id)))]
+            while work:
+                frame_id, destinations = work[-1]
+                for destination_id in destinations:
+                    if destination_id not in index_of:
+                        index_of[destination_id] = low_link[destination_id] = len(index_of)
+                        stack.append(destination_id)
+                        on_stack.add(destination_id)
+                        work.append((destination_id, iter(self.graph.destination_ids(destination_id))))
+                        break
+                    if destination_id in on_stack:
+                        low_link[frame_id] = min(low_link[frame_id], index_of[destination_id])
+                else:
+                    work.pop()
+                    if work:
+                        parent_id = work[-1][0]
+                        low_link[parent_id] = min(low_link[parent_id], low_link[frame_id])
+                    if low_link[frame_id] == index_of[frame_id]:
+                        component = []
+                        while True:
+                            member_id = stack.pop()
+                            on_stack.discard(member_id)
+                            component.append(member_id)
+                            if member_id == frame_id:
+                                break
+                        components.append(component)
+
+        self._components = components
+        return components
+
+    def reachable_from(self, source_id: int) -> set:
+        reached = {source_id}
+        queue = deque([source_id])
+        while queue:
+            for destination_id in self.graph.destination_ids(queue.popleft()):
+                if destination_id not in reached:
+                    reached.add(destination_id)
+                    queue.append(destination_id)
+        return reached
+
+    def analyze(self, start_name: Optional[str] = None) -> GraphReport:
+        """Find every problem with the graph in one pass."""
+        self._invalidate_if_graph_changed()
+        components = self.strongly_connected_components()
+        frame_ids = list(self.graph.frame_ids())
+
+        dead_ends = [self.graph.name(f) for f in frame_ids if not self.graph.destination_ids(f)]
+        unreferenced = [self.graph.name(f) for f in frame_ids
+                        if not any(previous_id != f for previous_id in self._reverse_adjacency[f])]
+        unreachable = []
+        start_id = self.graph.frame_id(start_name) if start_name else None
+        if start_id is not None:
+            reached = self.reachable_from(start_id)
+            unreachable = [self.graph.name(f) for f in frame_ids if f not in reached]
+
+        return GraphReport(len(frame_ids), len(components), max((len(c) for c in components), default=0),
+                           dead_ends, unreferenced, unreachable, self.graph.missing_aliases())
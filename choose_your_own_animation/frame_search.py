@@ -0,0 +1,61 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Words are runs of letters and digits, so `Bouncing_001` can be found by `bouncing` or `001`.
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class FrameSearchIndex:
+    """
+    Finds frames by the words in their names, aliases and comments, without needing Krita.
+
+    Every word maps to the frames containing it, and the words are also kept sorted, so the frames for a prefix are
+    found by a binary search followed by a scan over only the words sharing that prefix. A query matches the frames
+    that contain a word starting with each of its terms.
+    """
+
+    def __init__(self, frames: Iterable[Tuple[str, List[str], List[str]]] = (), version: int = -1):
+        """`frames` holds the name, aliases and comments of every frame."""
+        self.version = version
+        self._frame_names: List[str] = []
+        postings: Dict[str, Set[int]] = defaultdict(set)
+        for frame_name, aliases, comments in frames:
+            frame_index = len(self._frame_names)
+            self._frame_names.append(frame_name)
+            for text in [frame_name, *aliases, *comments]:
+                for token in tokenize(text):
+                    postings[token].add(frame_index)
+        self._postings = dict(postings)
+        self._sorted_tokens = sorted(self._postings)
+
+    def __len__(self) -> int:
+        return len(self._frame_names)
+
+    def search(self, query: str) -> Optional[Set[str]]:
+        """The names of the frames matching every term of the query, or None if the query has no terms."""
+        terms = tokenize(query)
+        if not terms:
+            return None
+
+        matching_indices: Optional[Set[int]] = None
+        # Longer terms usually match fewer frames, so intersecting from them keeps the working set small.
+        for term in sorted(set(terms), key=len, reverse=True):
+            term_indices = self._match_prefix(term)
+            matching_indices = term_indices if matching_indices is None else matching_indices & term_indices
+            if not matching_indices:
+                return set()
+        return {self._frame_names[frame_index] for frame_index in matching_indices}
+
+    def _match_prefix(self, prefix: str) -> Set[int]:
+        indices: Set[int] = set()
+        position = bisect_left(self._sorted_tokens, prefix)
+        while position < len(self._sorted_tokens) and self._sorted_tokens[position].startswith(prefix):
+            indices.update(self._postings[self._sorted_tokens[position]])
+            position += 1
+        return indices
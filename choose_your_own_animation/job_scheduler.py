@@ -0,0 +1,95 @@
+import time
+from typing import Callable, Iterator, NamedTuple, Optional
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+
+class JobProgress(NamedTuple):
+    phase: str
+    done: int
+    total: int
+
+
+class JobScheduler(QObject):
+    """
+    Runs one long job at a time on the GUI thread, a small slice at a time from the Qt event loop.
+
+    A job is a generator that does a small unit of work between yields, and yields a JobProgress after each one.
+    Krita's API has to be used from the main thread, so rather than using threads, the scheduler keeps calling the
+    generator for a short time slice and then returns to the event loop so Krita can repaint and handle input.
+    Cancelling closes the generator, so its `finally` blocks can save whatever state lets the job resume later.
+    """
+    TIME_SLICE_SECONDS = 0.05
+
+    # Phase, units done, units in total, and estimated seconds left in the phase (negative if unknown).
+    progress_changed = pyqtSignal(str, int, int, float)
+    running_changed = pyqtSignal(bool)
+
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._job: Optional[Iterator[JobProgress]] = None
+        self._on_finished: Optional[Callable[[bool], None]] = None
+        self._phase = ""
+        self._phase_start_time = 0.0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._run_slice)
+
+    def is_running(self) -> bool:
+        return self._job is not None
+
+    def start(self, job: Iterator[JobProgress], on_finished: Callable[[bool], None]) -> None:
+        """Start a job. `on_finished` is called with True if the job was cancelled, and False if it completed."""
+        if self._job is not None:
+            raise RuntimeError("A job is already running.")
+        self._job = job
+        self._on_finished = on_finished
+        self._phase = ""
+        self.running_changed.emit(True)
+        self._timer.start()
+
+    def cancel(self) -> None:
+        if self._job is None:
+            return
+        self._timer.stop()
+        self._job.close()
+        self._finish(cancelled=True)
+
+    def _run_slice(self) -> None:
+        slice_end_time = time.perf_counter() + self.TIME_SLICE_SECONDS
+        progress = None
+        try:
+            while time.perf_counter() < slice_end_time:
+                progress = next(self._job)
+        except StopIteration:
+            self._finish(cancelled=False)
+            return
+        except Exception:
+            # Let the caller recover its controls before the error reaches Krita.
+            self._finish(cancelled=True)
+            raise
+
+        if progress is not None:
+            self._report(progress)
+        self._timer.start()
+
+    def _report(self, progress: JobProgress) -> None:
+        now = time.perf_counter()
+        if progress.phase != self._phase:
+            self._phase = progress.phase
+            self._phase_start_time = now
+
+        seconds_left = -1.0
+        if 0 < progress.done < progress.total:
+            elapsed = now - self._phase_start_time
+            seconds_left = elapsed / progress.done * (progress.total - progress.done)
+        self.progress_changed.emit(progress.phase, progress.done, progress.total, seconds_left)
+
+    def _finish(self, cancelled: bool) -> None:
+        on_finished = self._on_finished
+        self._job = None
+        self._on_finished = None
+        self.running_changed.emit(False)
+        if on_finished:
+            on_finished(cancelled)
@@ -0,0 +1,35 @@
+from collections import deque
+from typing import Deque, List, NamedTuple
+
+
+class LogEntry(NamedTuple):
+    time: str
+    level: str
+    text: str
+
+    def format(self) -> str:
+        return f"{self.time} {self.level} {self.text}"
+
+
+class LogBuffer:
+    """The most recent log entries, which can be filtered down to a minimum level."""
+    LEVELS = ["DEBUG", "INFO", "WARN", "ERROR"]
+    MAX_ENTRIES = 5000
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self._entries: Deque[LogEntry] = deque(maxlen=max_entries)
+        self.minimum_level = "INFO"
+
+    def append(self, entry: LogEntry) -> bool:
+        """Add an entry, returning whether it passes the level filter."""
+        self._entries.append(entry)
+        return self.is_shown(entry)
+
+    def is_shown(self, entry: LogEntry) -> bool:
+        return self.LEVELS.index(entry.level) >= self.LEVELS.index(self.minimum_level)
+
+    def shown_entries(self) -> List[LogEntry]:
+        return [entry for entry in self._entries if self.is_shown(entry)]
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,311 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+from PyQt5.QtCore import QElapsedTimer, QObject, QRect, QRunnable, QSize, Qt, QThreadPool, QTimer, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QPainter
+from PyQt5.QtWidgets import QSizePolicy, QWidget
+
+from .timeline import Timeline, TimelineEntry
+
+
+class _DecodeSignals(QObject):
+    # Generation, cache key and image. An image that failed to decode is null.
+    decoded = pyqtSignal(int, str, QImage)
+
+
+class _DecodeTask(QRunnable):
+    """Reads one exported frame on a worker thread. Only Qt's image classes are used, never Krita's API."""
+
+    def __init__(self, generation: int, key: str, filepath: str, target_size: QSize, signals: _DecodeSignals):
+        super().__init__()
+        self.generation = generation
+        self.key = key
+        self.filepath = filepath
+        self.target_size = target_size
+        self.signals = signals
+
+    def run(self) -> None:
+        reader = QImageReader(self.filepath)
+        image_size = reader.size()
+        if self.target_size.isValid() and image_size.isValid() and \
+                (image_size.width() > self.target_size.width() or image_size.height() > self.target_size.height()):
+            image_size.scale(self.target_size, Qt.KeepAspectRatio)
+            reader.setScaledSize(image_size)
+        image = reader.read()
+        if not image.isNull():
+            # The format QPainter draws fastest, so painting never has to convert it.
+            image = image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+        self.signals.decoded.emit(self.generation, self.key, image)
+
+
+class FrameImageCache(QObject):
+    """
+    Decoded frame images for the preview, kept in least recently used order within a memory budget.
+
+    Images are decoded on a small thread pool and arrive on the GUI thread through a signal. Images are stored by
+    key, so frames with the same pixels, which share a fingerprint, are decoded and kept once. Frames are decoded no
+    larger than the target size, so a small preview holds many more of them, and the frames about to be shown are
+    never evicted to make room.
+    """
+    MEMORY_BUDGET_BYTES = 256 * 1024 * 1024
+    DECODE_THREAD_COUNT = 2
+    # Target sizes are rounded up to this, so resizing the preview a little doesn't throw every image away.
+    TARGET_SIZE_STEP = 64
+
+    image_ready = pyqtSignal(str)
+
+    def __init__(self, filepath_provider: Callable[[str], str], key_provider: Callable[[str], str],
+                 memory_budget_bytes: int = MEMORY_BUDGET_BYTES, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.filepath_provider = filepath_provider
+        self.key_provider = key_provider
+        self.memory_budget_bytes = memory_budget_bytes
+        self._images: "OrderedDict[str, QImage]" = OrderedDict()
+        self._total_bytes = 0
+        self._target_size = QSize()
+        self._pending_keys: Dict[str, None] = {}
+        self._protected_keys: Dict[str, None] = {}
+        # Frames whose files couldn't be read aren't tried again until the next clear().
+        self._missing_keys: Dict[str, None] = {}
+        # Decodes requested before the last clear() are ignored when they finish.
+        self._generation = 0
+
+        self._thread_pool = QThreadPool(self)
+        self._thread_pool.setMaxThreadCount(self.DECODE_THREAD_COUNT)
+        self._signals = _DecodeSignals(self)
+        self._signals.decoded.connect(self._store)
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    @property
+    def missing_count(self) -> int:
+        return len(self._missing_keys)
+
+    def get(self, frame_name: str) -> Optional[QImage]:
+        """The decoded image if it's ready. Otherwise its decoding is started, and None is returned."""
+        key = self.key_provider(frame_name)
+        image = self._images.get(key)
+        if image is None:
+            self._request(key, frame_name)
+            return None
+        self._images.move_to_end(key)
+        return image
+
+    def prefetch(self, frame_names: Iterable[str]) -> None:
+        """Start decoding the frames about to be shown. They're kept until the next prefetch, whatever the budget."""
+        self._protected_keys = {}
+        for frame_name in frame_names:
+            key = self.key_provider(frame_name)
+            self._protected_keys[key] = None
+            if key not in self._images:
+                self._request(key, frame_name)
+
+    def set_target_size(self, size: QSize) -> None:
+        """Decode frames to fit `size`. Images decoded for another size are dropped."""
+        step = self.TARGET_SIZE_STEP
+        target_size = QSize(-(-size.width() // step) * step, -(-size.height() // step) * step)
+        if target_size != self._target_size:
+            self._target_size = target_size
+            self.clear()
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._images.clear()
+        self._pending_keys.clear()
+        self._protected_keys.clear()
+        self._missing_keys.clear()
+        self._total_bytes = 0
+
+    def _request(self, key: str, frame_name: str) -> None:
+        if key in self._pending_keys or key in self._missing_keys:
+            return
+        self._pending_keys[key] = None
+        self._thread_pool.start(_DecodeTask(self._generation, key, self.filepath_provider(frame_name),
+                                            self._target_size, self._signals))
+
+    def _store(self, generation: int, key: str, image: QImage) -> None:
+        if generation != self._generation:
+            return
+        self._pending_keys.pop(key, None)
+        if image.isNull():
+            self._missing_keys[key] = None
+            return
+
+        self._images[key] = image
+        self._total_bytes += image.sizeInBytes()
+        if self._total_bytes > self.memory_budget_bytes:
+            # The image just decoded is about to be shown, so it stays even if it's over budget on its own.
+            evictable_keys = [evictable_key for evictable_key in self._images
+                              if evictable_key != key and evictable_key not in self._protected_keys]
+            for evicted_key in evictable_keys:
+                if self._total_bytes <= self.memory_budget_bytes:
+                    break
+                self._total_bytes -= self._images.pop(evicted_key).sizeInBytes()
+        self.image_ready.emit(key)
+
+
+class PreviewView(QWidget):
+    """Paints the current preview image, scaled to fit. Setting an image only keeps a reference to it."""
+
+    # The size in device pixels, which is the largest an image needs to be decoded.
+    resized = pyqtSignal(QSize)
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self._image: Optional[QImage] = None
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+
+    def sizeHint(self) -> QSize:
+        return QSize(240, 160)
+
+    def set_image(self, image: Optional[QImage]) -> None:
+        self._image = image
+        self.update()
+
+    def resizeEvent(self, event) -> None:
+        super().resizeEvent(event)
+        self.resized.emit(self.size() * self.devicePixelRatioF())
+
+    def paintEvent(self, event) -> None:
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.black)
+        if self._image is None:
+            return
+        image_size = self._image.size()
+        image_size.scale(self.size(), Qt.KeepAspectRatio)
+        target = QRect((self.width() - image_size.width()) // 2, (self.height() - image_size.height()) // 2,
+                       image_size.width(), image_size.height())
+        painter.drawImage(target, self._image)
+
+
+class PreviewPlayer(QObject):
+    """
+    Plays a timeline, followed by a short continuation that isn't part of it yet, from the exported frame files.
+
+    The frame to show is worked out from the time since playback started, so a slow tick skips frames instead of
+    slowing the animation down. A tick only looks up an entry and hands an already decoded image to the view. Each
+    time the entry changes, the next few frames are prefetched. A frame that isn't decoded in time is counted as late,
+    and the previous image stays up.
+    """
+    PREFETCH_ENTRY_COUNT = 12
+
+    # The frame name now showing.
+    frame_changed = pyqtSignal(str)
+
+    def __init__(self, view: PreviewView, cache: FrameImageCache, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.view = view
+        self.cache = cache
+        self.late_count = 0
+
+        self._timeline = Timeline()
+        self._continuation = Timeline()
+        self._start_time = 0
+        self._frames_per_second = 24
+        self._shown_frame_name = ""
+        self._shown_image: Optional[QImage] = None
+        self._entry_position = -1
+
+        self._elapsed_timer = QElapsedTimer()
+        self._tick_timer = QTimer(self)
+        self._tick_timer.setTimerType(Qt.PreciseTimer)
+        self._tick_timer.timeout.connect(self._tick)
+        self.cache.image_ready.connect(self._show_if_waiting)
+        self.view.resized.connect(self.cache.set_target_size)
+        self.cache.set_target_size(self.view.size() * self.view.devicePixelRatioF())
+
+    def is_playing(self) -> bool:
+        return self._tick_timer.isActive()
+
+    def play(self, timeline: Timeline, continuation: List[TimelineEntry], frames_per_second: int,
+             start_time: int = 0) -> None:
+        """Play from `start_time` to the end of the continuation, then loop back to `start_time`."""
+        self.set_sequence(timeline, continuation)
+        self._frames_per_second = max(1, frames_per_second)
+        self._start_time = max(0, start_time)
+        self._shown_frame_name = ""
+        self._entry_position = -1
+        self.late_count = 0
+        self._elapsed_timer.start()
+        self._tick_timer.start(max(1, 1000 // self._frames_per_second))
+        self._tick()
+
+    def set_sequence(self, timeline: Timeline, continuation: List[TimelineEntry]) -> None:
+        """Change what's playing without restarting, such as when the hovered or queued frames change."""
+        self._timeline = timeline
+        self._continuation = Timeline(continuation)
+        self._entry_position = -1
+
+    def stop(self) -> None:
+        self._tick_timer.stop()
+
+    def _frame_count(self) -> int:
+        return self._timeline.frame_count + self._continuation.frame_count
+
+    def _tick(self) -> None:
+        frame_count = self._frame_count()
+        if frame_count == 0:
+            self.stop()
+            return
+        start_time = self._start_time if self._start_time < frame_count else 0
+        elapsed_frames = self._elapsed_timer.elapsed() * self._frames_per_second // 1000
+        time = start_time + elapsed_frames % (frame_count - start_time)
+
+        entry_position = self._entry_position_at_time(time)
+        # An entry counts as late once, however many ticks pass before its image arrives.
+        is_new_entry = entry_position != self._entry_position
+        if is_new_entry:
+            self._entry_position = entry_position
+            self._prefetch_from(entry_position)
+        frame_name = self._entry_at_position(entry_position).frame_name
+        if frame_name != self._shown_frame_name:
+            self._show(frame_name, count_late=is_new_entry)
+
+    def _show(self, frame_name: str, count_late: bool) -> None:
+        image = self.cache.get(frame_name)
+        if image is None:
+            if count_late:
+                self.late_count += 1
+            return
+        self._shown_frame_name = frame_name
+        if image is not self._shown_image:
+            self._shown_image = image
+            self.view.set_image(image)
+        self.frame_changed.emit(frame_name)
+
+    def _show_if_waiting(self, key: str) -> None:
+        # A late frame is shown as soon as it arrives, unless playback has already moved past it.
+        if not self.is_playing() or not 0 <= self._entry_position < len(self._timeline) + len(self._continuation):
+            return
+        frame_name = self._entry_at_position(self._entry_position).frame_name
+        if frame_name != self._shown_frame_name and self.cache.key_provider(frame_name) == key:
+            self._show(frame_name, count_late=False)
+
+    def _entry_position_at_time(self, time: int) -> int:
+        """Entries of the timeline come first, then those of the continuation, numbered as one sequence."""
+        if time < self._timeline.frame_count:
+            return self._timeline.index_at_time(time)
+        return len(self._timeline) + self._continuation.index_at_time(time - self._timeline.frame_count)
+
+    def _entry_at_position(self, position: int) -> TimelineEntry:
+        if position < len(self._timeline):
+            return self._timeline[position]
+        return self._continuation[position - len(self._timeline)]
+
+    def _prefetch_from(self, position: int) -> None:
+        entry_count = len(self._timeline) + len(self._continuation)
+        first_position = self._entry_position_at_time(self._start_time) if self._start_time < self._frame_count() \
+            else 0
+        frame_names = [self._entry_at_position(position).frame_name]
+        for offset in range(1, min(self.PREFETCH_ENTRY_COUNT, entry_count) + 1):
+            next_position = position + offset
+            if next_position >= entry_count:
+                next_position = first_position + (next_position - entry_count) % (entry_count - first_position)
+            frame_names.append(self._entry_at_position(next_position).frame_name)
+        self.cache.prefetch(frame_names)
@@ -0,0 +1,74 @@
+import json
+import time
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, NamedTuple
+
+
+class Span(NamedTuple):
+    name: str
+    start_us: float
+    duration_us: float
+
+
+class SpanSummary(NamedTuple):
+    name: str
+    count: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+
+
+class Profiler:
+    """
+    Records how long named operations take, keeping only the most recent spans.
+
+    Spans measure wall time. A span around a job that yields to the event loop includes the time spent in between.
+    """
+    MAX_SPANS = 100_000
+
+    def __init__(self, max_spans: int = MAX_SPANS):
+        self._spans: Deque[Span] = deque(maxlen=max_spans)
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._spans.append(Span(name, (start - self._origin) * 1e6, (end - start) * 1e6))
+
+    def spans(self) -> List[Span]:
+        return list(self._spans)
+
+    def clear(self) -> None:
+        self._spans.clear()
+
+    def summary(self) -> List[SpanSummary]:
+        """Totals per span name, slowest total first."""
+        durations: Dict[str, List[float]] = defaultdict(list)
+        for span in self._spans:
+            durations[span.name].append(span.duration_us)
+
+        rows = [SpanSummary(name, len(values), sum(values) / 1e3, sum(values) / len(values) / 1e3, max(values) / 1e3)
+                for name, values in durations.items()]
+        return sorted(rows, key=lambda row: row.total_ms, reverse=True)
+
+    def format_summary(self) -> str:
+        lines = [f"{'span':<24} {'count':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9}"]
+        for row in self.summary():
+            lines.append(f"{row.name:<24} {row.count:>7} {row.total_ms:>10.1f} {row.mean_ms:>9.2f} {row.max_ms:>9.2f}")
+        return "\n".join(lines)
+
+    def to_json(self) -> str:
+        return json.dumps({"summary": [row._asdict() for row in self.summary()],
+                           "spans": [span._asdict() for span in self._spans]}, indent=1)
+
+    def to_chrome_trace(self) -> str:
+        """The spans in the Trace Event Format, which chrome://tracing and Perfetto can open."""
+        events = [{"name": span.name, "cat": "cyoa", "ph": "X", "ts": round(span.start_us, 1),
+                   "dur": round(span.duration_us, 1), "pid": 1, "tid": 1}
+                  for span in self._spans]
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
@@ -0,0 +1,114 @@
+import random
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+from .frame_graph import FrameGraph
+from .frame_routes import FrameRoutes
+from .timeline import TimelineEntry
+
+
+class SequenceGenerator:
+    """
+    Builds long animations by taking a weighted random walk over a FrameGraph, without touching Krita.
+
+    Each step picks one of the current frame's destinations in proportion to its weight, and shows it for a duration
+    drawn from the frame's duration range. With an end frame, only destinations that can still reach it are picked,
+    and once the remaining length is about what the shortest route to the end needs, the walk follows that route.
+    Cumulative weights are computed once per frame, so every step costs a binary search.
+    """
+
+    def __init__(self, routes: FrameRoutes, default_duration: int, rng: Optional[random.Random] = None):
+        self.graph: FrameGraph = routes.graph
+        self.routes = routes
+        self.default_duration = default_duration
+        self.rng = rng or random.Random()
+        # Per frame, its candidate destinations and their running total of weights.
+        self._choices: Dict[int, Tuple[List[int], List[float]]] = {}
+        self._distances: Optional[Dict[int, int]] = None
+
+    def generate(self, start_name: Optional[str], length: int, end_name: Optional[str] = None) -> List[TimelineEntry]:
+        """
+        Entries to append after `start_name` that add up to `length` timeline frames. Without a start, the walk
+        begins on a random frame. With an end frame, the sequence ends on it, which can make it a little longer or
+        shorter than asked. The sequence stops early at a frame with no possible futures.
+        """
+        graph = self.graph
+        self._choices = {}
+        self._distances = None
+        next_hops: Dict[int, int] = {}
+        end_id = None
+        if end_name:
+            end_id = graph.frame_id(end_name)
+            if end_id is None:
+                raise ValueError(f"No frames in index for: {end_name}")
+            self._distances, next_hops = self.routes.routes_to(end_id)
+
+        current_id = graph.frame_id(start_name) if start_name else None
+        if current_id is None and start_name:
+            raise ValueError(f"No frames in index for: {start_name}")
+        if self._distances is not None and current_id is not None and current_id not in self._distances:
+            raise ValueError(f"{end_name} can't be reached from {start_name}.")
+
+        entries: List[TimelineEntry] = []
+        total = 0
+        while total < length:
+            if self._distances is not None and current_id is not None:
+                remaining_steps = self._distances[current_id]
+                if remaining_steps and length - total <= remaining_steps * self.default_duration:
+                    break
+            next_id = self._pick_next(current_id)
+            if next_id is None:
+                break
+            current_id = next_id
+            duration = self._pick_duration(current_id)
+            entries.append(TimelineEntry(graph.name(current_id), duration))
+            total += duration
+
+        if end_id is not None:
+            if current_id is None:
+                current_id = end_id
+                entries.append(TimelineEntry(graph.name(end_id), self._pick_duration(end_id)))
+            while current_id != end_id:
+                current_id = next_hops[current_id]
+                entries.append(TimelineEntry(graph.name(current_id), self._pick_duration(current_id)))
+        elif entries and total > length:
+            # Without an end frame to honour, trim the last entry so the length comes out exact.
+            last = entries[-1]
+            entries[-1] = TimelineEntry(last.frame_name, last.duration - (total - length))
+        return entries
+
+    def _pick_next(self, frame_id: Optional[int]) -> Optional[int]:
+        if frame_id is None:
+            frame_ids = list(self._distances) if self._distances is not None else list(self.graph.frame_ids())
+            return self.rng.choice(frame_ids) if frame_ids else None
+
+        choices = self._choices.get(frame_id)
+        if choices is None:
+            choices = self._build_choices(frame_id)
+            self._choices[frame_id] = choices
+        candidate_ids, cumulative_weights = choices
+        if not candidate_ids:
+            return None
+        index = bisect_right(cumulative_weights, self.rng.random() * cumulative_weights[-1])
+        return candidate_ids[min(index, len(candidate_ids) - 1)]
+
+    def _build_choices(self, frame_id: int) -> Tuple[List[int], List[float]]:
+        candidate_ids = []
+        weights = []
+        for destination_id, weight in zip(self.graph.destination_ids(frame_id),
+                                          self.graph.destination_weights(frame_id)):
+            if weight <= 0:
+                continue
+            # Never wander somewhere the end frame can't be reached from.
+            if self._distances is not None and destination_id not in self._distances:
+                continue
+            candidate_ids.append(destination_id)
+            weights.append(weight)
+        return candidate_ids, list(accumulate(weights))
+
+    def _pick_duration(self, frame_id: int) -> int:
+        duration_range = self.graph.duration_range(frame_id)
+        if not duration_range:
+            return self.default_duration
+        return self.rng.randint(*duration_range)
@@ -0,0 +1,68 @@
+import os
+from collections import OrderedDict
+from typing import Callable, Iterable, Tuple
+
+from PyQt5.QtGui import QImage
+
+
+class ThumbnailCache:
+    """
+    Frame thumbnails keyed by frame name and content fingerprint.
+
+    Recently used thumbnails are kept in memory, and every thumbnail is also saved as a PNG so that it survives a
+    restart of Krita. A frame whose pixels change gets a new fingerprint, so its old thumbnail is never returned.
+    """
+    FILE_EXTENSION = ".png"
+
+    def __init__(self, directory: str, capacity: int = 1024):
+        self.directory = directory
+        self.capacity = capacity
+        self._images: "OrderedDict[Tuple[str, str], QImage]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get(self, frame_name: str, fingerprint: str, render: Callable[[], QImage]) -> QImage:
+        key = (frame_name, fingerprint)
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+            self.memory_hits += 1
+            return image
+
+        filepath = self._get_filepath(fingerprint)
+        image = QImage()
+        if image.load(filepath):
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            image = render()
+            image.save(filepath, "PNG")
+
+        self._images[key] = image
+        if len(self._images) > self.capacity:
+            self._images.popitem(last=False)
+        return image
+
+    def memory_bytes(self) -> int:
+        return sum(image.sizeInBytes() for image in self._images.values())
+
+    def prune(self, fingerprints: Iterable[str]) -> int:
+        """Delete thumbnails on disk that don't belong to any of the given fingerprints."""
+        keep_filenames = {fingerprint + self.FILE_EXTENSION for fingerprint in fingerprints}
+        removed_count = 0
+        for filename in os.listdir(self.directory):
+            if filename.endswith(self.FILE_EXTENSION) and filename not in keep_filenames:
+                os.remove(os.path.join(self.directory, filename))
+                removed_count += 1
+        return removed_count
+
+    def reset_counts(self) -> None:
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _get_filepath(self, fingerprint: str) -> str:
+        # Frames with the same pixels share a fingerprint, and can share a thumbnail too.
+        return os.path.join(self.directory, fingerprint + self.FILE_EXTENSION)
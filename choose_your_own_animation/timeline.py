@@ -0,0 +1,102 @@
+from bisect import bisect_right
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+
+class TimelineEntry(NamedTuple):
+    frame_name: str
+    duration: int
+
+
+class Timeline:
+    """
+    The ordered entries of an animation, each showing one frame for a number of timeline frames.
+
+    The start time of every entry and the total frame count are kept as entries are added and removed, so that the
+    length is O(1), finding the entry shown at a time is O(log n), and appending or truncating only costs the entries
+    being added or removed. Inserting, deleting or retiming an entry costs the entries after it.
+    """
+
+    def __init__(self, entries: Iterable[TimelineEntry] = ()):
+        self._entries: List[TimelineEntry] = []
+        self._start_times: List[int] = []
+        self._frame_count = 0
+        self.extend(entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[TimelineEntry]:
+        return iter(self._entries)
+
+    def __getitem__(self, index: int) -> TimelineEntry:
+        return self._entries[index]
+
+    @property
+    def frame_count(self) -> int:
+        return self._frame_count
+
+    def start_time(self, index: int) -> int:
+        return self._start_times[index]
+
+    def last(self) -> Optional[TimelineEntry]:
+        return self._entries[-1] if self._entries else None
+
+    def append(self, frame_name: str, duration: int) -> None:
+        self._check_duration(duration)
+        self._entries.append(TimelineEntry(frame_name, duration))
+        self._start_times.append(self._frame_count)
+        self._frame_count += duration
+
+    def extend(self, entries: Iterable[TimelineEntry]) -> None:
+        for frame_name, duration in entries:
+            self.append(frame_name, duration)
+
+    def truncate(self, length: int) -> List[TimelineEntry]:
+        """Keep only the first `length` entries, returning the ones removed."""
+        length = max(0, length)
+        removed = self._entries[length:]
+        if removed:
+            self._frame_count = self._start_times[length]
+            del self._entries[length:]
+            del self._start_times[length:]
+        return removed
+
+    def insert(self, index: int, frame_name: str, duration: int) -> None:
+        """Insert an entry before `index`. Only the start times of the entries after it are updated."""
+        if index < 0 or index > len(self._entries):
+            raise IndexError(f"Entry {index} is outside of the timeline (0-{len(self._entries)})")
+        self._check_duration(duration)
+        tail = self.truncate(index)
+        self.append(frame_name, duration)
+        self.extend(tail)
+
+    def delete(self, index: int) -> TimelineEntry:
+        """Remove the entry at `index`, returning it."""
+        tail = self.truncate(self._check_index(index))
+        self.extend(tail[1:])
+        return tail[0]
+
+    def set_duration(self, index: int, duration: int) -> None:
+        self._check_duration(duration)
+        tail = self.truncate(self._check_index(index))
+        self.append(tail[0].frame_name, duration)
+        self.extend(tail[1:])
+
+    def _check_index(self, index: int) -> int:
+        if index < 0 or index >= len(self._entries):
+            raise IndexError(f"Entry {index} is outside of the timeline (0-{len(self._entries) - 1})")
+        return index
+
+    @staticmethod
+    def _check_duration(duration: int) -> None:
+        if duration < 1:
+            raise ValueError(f"Duration must be at least 1 frame: {duration}")
+
+    def index_at_time(self, time: int) -> int:
+        """The index of the entry shown at the given timeline frame."""
+        if time < 0 or time >= self._frame_count:
+            raise IndexError(f"Time {time} is outside of the timeline (0-{self._frame_count - 1})")
+        return bisect_right(self._start_times, time) - 1
+
+    def entry_at_time(self, time: int) -> TimelineEntry:
+        return self._entries[self.index_at_time(time)]